@@ -0,0 +1,48 @@
+# ###    PySame    ###
+#
+# SAME header generator. The encoder and synthesis functions only need NumPy;
+# the validators load the reference catalogs lazily on their first call.
+#
+# The names below are imported from their submodules on first use, so importing
+# pysame (or a submodule that does not need NumPy, such as pysame.snapshot) does
+# not pay for NumPy and the rest of the package up front.
+
+import importlib
+
+_exports = {
+    'formats': ('FORMATS', 'TIMINGS', 'get_format'),
+    'header': ('binary_to_signal', 'create_header', 'parse_header', 'preamble', 'write_audio_file'),
+    'validate': ('CHECKS', 'FIELDS', 'check_1', 'check_2', 'check_3', 'check_4', 'check_5', 'check_6', 'stages'),
+    'batchvalidate': ('validate_columns', 'validate_records'),
+    'catalog': ('CatalogWatcher', 'get_catalog', 'reload_catalog'),
+    'search': ('search_counties', 'search_events', 'search_states'),
+    'locations': ('LocationPlan', 'header_fields', 'resolve_locations'),
+    'glyphcache': ('render_header',),
+    'assembler': ('message_blocks',),
+    'wavstream': ('RawWriter', 'WavWriter', 'write_stream'),
+    'template': ('HeaderTemplate',),
+    'diskcache': ('DiskCache', 'cache_key'),
+    'scheduler': ('Scheduler', 'SimulatedClock', 'event_level'),
+}
+_origins = {name: module for module, names in _exports.items() for name in names}
+
+__all__ = sorted(_origins)
+
+
+def __getattr__(name):
+    if name in _origins:
+        value = getattr(importlib.import_module('.' + _origins[name], __name__), name)
+    else:
+        # submodules stay reachable as attributes (pysame.instrument) without an explicit import
+        try:
+            value = importlib.import_module('.' + name, __name__)
+        except ModuleNotFoundError as e:
+            if e.name != '{}.{}'.format(__name__, name):
+                raise
+            raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_origins))
@@ -0,0 +1,125 @@
+# ###    PySame message assembler    ###
+#
+# Builds a complete EAS activation: the header burst three times with 1 second gaps,
+# an optional 853/960 Hz attention tone, an optional audio insert, and the NNNN
+# end-of-message burst three times. The message is produced as a generator of
+# fixed-size PCM blocks so memory use does not depend on the message length.
+
+import numpy as np
+
+from .formats import bit_starts, decode, get_format
+from .glyphcache import PREAMBLE, render_header
+from .synthesis import convert_samples
+
+EOM = 'NNNN'
+ATTENTION_FREQS = (853.0, 960.0)
+BURSTS = 3
+GAP = 1.0
+BLOCK_SIZE = 4096
+
+
+# Yields the whole message as blocks of block_size samples (the last block may be shorter).
+# header is the text returned by create_header, attention is the tone length in seconds
+# (0 for none) and audio is an optional iterable of sample chunks inserted after the tone
+# (floats in [-1, 1], signed integer PCM or uint8 mu-law).
+# dtype is a NumPy dtype or a format name from pysame.formats; timing is 'legacy' or 'exact'
+# and renderer is 'table' or 'nco' (see pysame.synthesis). burst is an already rendered
+# header (e.g. HeaderTemplate.signal) to send instead of rendering header again.
+def message_blocks(header, sample_rate=44100, dtype=np.int16, block_size=BLOCK_SIZE, attention=8.0, audio=None, gap=GAP,
+                   timing='legacy', renderer='table', burst=None):
+    segments = message_segments(header, sample_rate, dtype, block_size, attention, audio, gap, timing, renderer, burst)
+    return _rechunk(segments, block_size, get_format(dtype).dtype)
+
+
+# Yields the message as variable-length chunks, in order, without rechunking.
+def message_segments(header, sample_rate=44100, dtype=np.int16, block_size=BLOCK_SIZE, attention=8.0, audio=None, gap=GAP,
+                     timing='legacy', renderer='table', burst=None):
+    gap_samples = int(gap * sample_rate)
+
+    if burst is None:
+        burst = render_header(header, sample_rate, dtype, timing, renderer)
+    for i in range(BURSTS):
+        yield burst
+        yield from silence(gap_samples, dtype, block_size)
+
+    if attention:
+        yield from attention_tone(int(attention * sample_rate), sample_rate, dtype, block_size)
+        yield from silence(gap_samples, dtype, block_size)
+
+    if audio is not None:
+        for chunk in audio:
+            yield _as_dtype(np.asarray(chunk), dtype)
+        yield from silence(gap_samples, dtype, block_size)
+
+    eom = render_header(EOM, sample_rate, dtype, timing, renderer)
+    for i in range(BURSTS):
+        yield eom
+        if i != BURSTS - 1:
+            yield from silence(gap_samples, dtype, block_size)
+
+
+# Number of samples message_blocks yields for the same arguments, without rendering anything.
+# audio_length is the total length of the audio insert in samples (None for no insert).
+def message_length(header, sample_rate=44100, attention=8.0, audio_length=None, gap=GAP, timing='legacy'):
+    gap_samples = int(gap * sample_rate)
+    length = BURSTS * (_burst_length(header, sample_rate, timing) + gap_samples)
+    if attention:
+        length += int(attention * sample_rate) + gap_samples
+    if audio_length is not None:
+        length += audio_length + gap_samples
+    return length + BURSTS * _burst_length(EOM, sample_rate, timing) + (BURSTS - 1) * gap_samples
+
+
+def _burst_length(text, sample_rate, timing):
+    return int(bit_starts((len(PREAMBLE) + len(text)) * 8, sample_rate, timing)[-1])
+
+
+# Yields length samples of silence, block_size at a time (mu-law silence is 0xFF, not 0).
+def silence(length, dtype=np.int16, block_size=BLOCK_SIZE):
+    zeros = convert_samples(np.zeros(min(length, block_size)), dtype)
+    zeros.setflags(write=False)
+    while length > 0:
+        n = min(length, block_size)
+        yield zeros[:n]
+        length -= n
+
+
+# Yields length samples of the two-tone attention signal, block_size at a time.
+def attention_tone(length, sample_rate, dtype=np.int16, block_size=BLOCK_SIZE):
+    w1, w2 = (2.0 * np.pi * f / sample_rate for f in ATTENTION_FREQS)
+    start = 0
+    while start < length:
+        n = np.arange(start, min(start + block_size, length))
+        yield convert_samples(0.5 * (np.sin(w1 * n) + np.sin(w2 * n)), dtype)
+        start += block_size
+
+
+def _as_dtype(chunk, dtype):
+    dtype = get_format(dtype).dtype
+    if chunk.dtype == dtype:
+        return chunk
+    if chunk.dtype == get_format('ulaw').dtype:
+        chunk = decode(chunk, 'ulaw')
+    elif chunk.dtype.kind == 'i':
+        chunk = chunk / np.iinfo(chunk.dtype).max
+    elif chunk.dtype.kind != 'f':
+        raise ValueError('Unsupported audio insert dtype {}'.format(chunk.dtype))
+    return convert_samples(chunk, dtype)
+
+
+def _rechunk(segments, block_size, dtype):
+    block = np.empty(block_size, dtype=dtype)
+    filled = 0
+    for seg in segments:
+        pos = 0
+        while pos < len(seg):
+            n = min(block_size - filled, len(seg) - pos)
+            block[filled:filled + n] = seg[pos:pos + n]
+            filled += n
+            pos += n
+            if filled == block_size:
+                yield block
+                block = np.empty(block_size, dtype=dtype)
+                filled = 0
+    if filled:
+        yield block[:filled]
@@ -0,0 +1,293 @@
+# ###    PySame batch mode    ###
+#
+# Renders SAME headers non-interactively from a JSON Lines or CSV job file.
+# Each record carries the six header fields, which are validated with the same
+# check_1 .. check_6 functions the interactive prompt uses. One WAV file is
+# written per valid record and every record gets a line in a JSON Lines manifest,
+# including the version of the catalog that validated it; invalid records are
+# reported there without stopping the run.
+#
+# Rendering is CPU-bound, so jobs can be spread over a process pool (-j). The
+# catalogs and tone tables are loaded once in the parent before the pool starts;
+# forked workers share them copy-on-write, and the tone tables are handed to the
+# workers explicitly on platforms that spawn instead of fork. Results are written
+# to the manifest in input order.
+#
+# usage: pysame-batch jobs.jsonl -o out/ [-m manifest.jsonl] [-j workers] [--strict] [--message]
+#                    [-r rate] [-s pcm16|float32|ulaw] [--timing legacy|exact] [--raw]
+#                    [--auto-resolve 0.8] [--stats stats.json|stats.prom] [--profile out.prof] [--tracemalloc N]
+
+import argparse
+from collections import namedtuple
+import csv
+import io
+import json
+import os
+import re
+import sys
+
+from .assembler import message_blocks
+from .catalog import get_catalog
+from .diskcache import DiskCache, cache_key
+from .formats import FORMATS, TIMINGS, drifts, get_format
+from .glyphcache import render_header
+from . import instrument
+from .header import create_header
+from .pool import render_pool, worker_settings
+from .search import correct_event, correct_locations
+from .synthesis import tone_table
+from .validate import CHECKS, FIELDS, stages
+from .wavstream import RawWriter, WavWriter
+
+# The process_job arguments shared by every record of a run.
+JobSettings = namedtuple('JobSettings', 'outdir sample_rate strict message cache_dir fmt timing raw auto_resolve')
+
+# Yields job records (dicts) from a .csv file or a JSON Lines file.
+# JSON records are either objects with the FIELDS keys or lists of six values.
+def read_jobs(path, fmt=None):
+    if fmt is None:
+        fmt = 'csv' if path.lower().endswith('.csv') else 'jsonl'
+
+    with open(path, newline='') as f:
+        if fmt == 'csv':
+            yield from csv.DictReader(f)
+            return
+        for line in f:
+            line = line.strip()
+            if line == '':
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield {'_error': 'Invalid JSON: {}'.format(e)}
+                continue
+            if isinstance(record, list):
+                record = dict(zip(FIELDS, record))
+            elif not isinstance(record, dict):
+                record = {'_error': 'Expected a JSON object or a list of fields'}
+            yield record
+
+
+# Misspelled event names and locations that search.correct_* can correct, by field index.
+_resolvers = {1: correct_event, 2: correct_locations}
+
+
+# Validates one record. Returns the validated field values, warnings and errors.
+# With auto_resolve (a score between 0 and 1), an event name or location that fails its
+# check is replaced by its closest match if that scores at least auto_resolve; the
+# substitution is reported as a warning. catalog pins the catalog to validate against
+# (default: the current one).
+def validate_job(record, auto_resolve=None, catalog=None):
+    if '_error' in record:
+        return None, [], [record['_error']]
+    catalog = catalog or get_catalog()
+
+    values = []
+    warnings = []
+    errors = []
+    for i in range(len(FIELDS)):
+        raw = record.get(FIELDS[i])
+        if raw is None:
+            errors.append('{}: missing'.format(stages[i + 1]))
+            continue
+        rtrn, res, msg = CHECKS[i](str(raw), catalog)
+        if res == 2 and auto_resolve is not None and i in _resolvers:
+            resolved, changes = _resolvers[i](str(raw), auto_resolve, catalog)
+            if changes:
+                retry = CHECKS[i](resolved, catalog)
+                if retry[1] != 2:
+                    rtrn, res, msg = retry
+                    warnings.append('{}: resolved {}'.format(stages[i + 1], ', '.join(
+                        '"{}" as "{}" ({:.2f})'.format(old, new, score) for old, new, score in changes)))
+        if res == 1:
+            warnings.append('{}: {}'.format(stages[i + 1], msg))
+        elif res == 2:
+            errors.append('{}: {}'.format(stages[i + 1], msg))
+        values.append(rtrn)
+
+    if errors:
+        return None, warnings, errors
+    return values, warnings, errors
+
+
+# Renders a header (or a complete message) as a WAV file (or headerless samples with raw)
+# to a file name or file object. fmt is a sample format name from pysame.formats.
+@instrument.timed()
+def render_job(header, target, sample_rate=44100, message=False, fmt='pcm16', timing='legacy', raw=False):
+    with (RawWriter(target, fmt) if raw else WavWriter(target, sample_rate, fmt)) as w:
+        if message:
+            w.write_blocks(message_blocks(header, sample_rate, fmt, attention=0, timing=timing))
+        else:
+            w.write(render_header(header, sample_rate, fmt, timing))
+
+
+# Same as render_job, returning the file as bytes.
+def render_bytes(header, sample_rate=44100, message=False, fmt='pcm16', timing='legacy', raw=False):
+    buf = io.BytesIO()
+    render_job(header, buf, sample_rate, message, fmt, timing, raw)
+    return buf.getvalue()
+
+
+_disk_caches = {}
+
+
+# Returns the rendered bytes for a header through the on-disk cache in cache_dir, and whether it was a hit.
+def render_cached(header, cache_dir, sample_rate=44100, message=False, fmt='pcm16', timing='legacy', raw=False):
+    cache = _disk_caches.get(cache_dir)
+    if cache is None:
+        cache = _disk_caches[cache_dir] = DiskCache(cache_dir)
+    key = cache_key(header, rate=sample_rate, format=fmt, layout='message' if message else 'header',
+                    timing=timing, container='raw' if raw else 'wav')
+    data = cache.get(key)
+    if data is not None:
+        return data, True
+    data = render_bytes(header, sample_rate, message, fmt, timing, raw)
+    cache.put(key, data)
+    return data, False
+
+
+def job_filename(record, row, ext='.wav'):
+    name = record.get('id') or record.get('filename')
+    if name:
+        name = re.sub(r'[^A-Za-z0-9._-]', '_', str(name))
+        if not name.lower().endswith(ext):
+            name += ext
+        return name
+    return '{:06d}{}'.format(row, ext)
+
+
+# Validates and renders one record, returning its manifest entry.
+def process_job(row, record, outdir, sample_rate=44100, strict=False, message=False, cache_dir=None,
+                fmt='pcm16', timing='legacy', raw=False, auto_resolve=None):
+    entry = {'row': row}
+    if not isinstance(record, dict):
+        entry.update(status='error', messages=['Expected a JSON object or a list of fields'])
+        return entry
+    if record.get('id') is not None:
+        entry['id'] = record['id']
+
+    catalog = get_catalog()
+    entry['catalog'] = catalog.version
+    try:
+        values, warnings, errors = validate_job(record, auto_resolve, catalog)
+    except Exception as e:
+        entry.update(status='error', messages=['Validation failed: {!r}'.format(e)])
+        return entry
+    if strict and warnings:
+        errors = errors + warnings
+    if errors:
+        entry.update(status='error', messages=errors + warnings)
+        return entry
+
+    binaryData, stringData = create_header(values)
+    path = os.path.join(outdir, job_filename(record, row, '.raw' if raw else '.wav'))
+    try:
+        if cache_dir is None:
+            render_job(stringData, path, sample_rate, message, fmt, timing, raw)
+        else:
+            data, entry['cached'] = render_cached(stringData, cache_dir, sample_rate, message, fmt, timing, raw)
+            with open(path, 'wb') as f:
+                f.write(data)
+    except OSError as e:
+        _remove_partial(path)
+        entry.update(status='error', header=stringData, messages=['Write failed: {}'.format(e)])
+    except ValueError as e:
+        _remove_partial(path)
+        entry.update(status='error', header=stringData, messages=['Render failed: {}'.format(e)])
+    else:
+        entry.update(status='warning' if warnings else 'ok', header=stringData, file=path, messages=warnings)
+    return entry
+
+
+# Removes what a failed render left of its output file, so a half-written file is not mistaken for a result.
+def _remove_partial(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+# Returns the manifest entry and, with instrumentation on, the stage timings recorded for it.
+def _pool_job(item):
+    entry = process_job(item[0], item[1], *worker_settings())
+    return entry, instrument.drain() if instrument.is_enabled() else None
+
+
+def _pool_entries(jobs, workers, settings, chunksize):
+    catalog = get_catalog()
+    if settings.auto_resolve is not None:
+        for kind in ('counties', 'states', 'events'):
+            catalog.search_index(kind)
+    tone_table(settings.sample_rate, settings.fmt, settings.timing)
+    with render_pool(workers, settings, instrument.is_enabled()) as pool:
+        for entry, stages in pool.imap(_pool_job, enumerate(jobs, 1), chunksize):
+            if stages:
+                instrument.merge(stages)
+            yield entry
+
+
+# Validates and renders every job, writing one manifest line per record in input order.
+# With strict, records that only produced warnings are rejected too. workers > 1 renders
+# on a process pool of that size; cache_dir reuses identical renders through a DiskCache.
+# fmt, timing and raw select the sample format, bit timing and headerless output;
+# auto_resolve corrects close misspellings of events and locations (see validate_job).
+def run_batch(jobs, outdir, manifest, sample_rate=44100, strict=False, message=False, workers=1, chunksize=32,
+              cache_dir=None, fmt='pcm16', timing='legacy', raw=False, auto_resolve=None):
+    counts = {'ok': 0, 'warning': 0, 'error': 0, 'cached': 0}
+    os.makedirs(outdir, exist_ok=True)
+
+    settings = JobSettings(outdir, sample_rate, strict, message, cache_dir, get_format(fmt).name, timing, raw,
+                           auto_resolve)
+    if workers > 1:
+        entries = _pool_entries(jobs, workers, settings, chunksize)
+    else:
+        entries = (process_job(row, record, *settings) for row, record in enumerate(jobs, 1))
+
+    for entry in entries:
+        counts[entry['status']] += 1
+        counts['cached'] += entry.get('cached', False)
+        manifest.write(json.dumps(entry) + '\n')
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Render SAME headers from a JSON Lines / CSV job file.')
+    parser.add_argument('jobs', help='job file (.jsonl or .csv)')
+    parser.add_argument('-o', '--outdir', default='.', help='directory for the WAV files')
+    parser.add_argument('-m', '--manifest', default=None, help='results manifest (default: <outdir>/manifest.jsonl)')
+    parser.add_argument('-f', '--format', choices=('jsonl', 'csv'), default=None, help='job file format (default: by extension)')
+    parser.add_argument('-r', '--rate', type=int, default=44100, help='sample rate')
+    parser.add_argument('-j', '--workers', type=int, default=1, help='worker processes (0 = one per CPU)')
+    parser.add_argument('--cache', default=None, help='directory of a render cache shared between runs')
+    parser.add_argument('--strict', action='store_true', help='reject records with warnings')
+    parser.add_argument('--message', action='store_true', help='render the full message (header x3 + EOM x3)')
+    parser.add_argument('-s', '--sample-format', choices=[f for f in FORMATS if f != 'float64'], default='pcm16',
+                        help='sample format of the output files')
+    parser.add_argument('--timing', choices=TIMINGS, default='legacy', help='bit timing (exact avoids baud drift)')
+    parser.add_argument('--raw', action='store_true', help='write headerless sample files instead of WAV')
+    parser.add_argument('--auto-resolve', type=float, default=None, metavar='SCORE',
+                        help='replace misspelled events and locations by their closest match scoring at least SCORE (0-1)')
+    instrument.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    if args.timing == 'legacy' and drifts(args.rate):
+        print('Note: at {} Hz legacy bit timing drifts from 520.83 baud; use --timing exact to compensate'.format(
+            args.rate), file=sys.stderr)
+
+    workers = args.workers or os.cpu_count() or 1
+    manifest_path = args.manifest or os.path.join(args.outdir, 'manifest.jsonl')
+    os.makedirs(args.outdir, exist_ok=True)
+    with open(manifest_path, 'w') as manifest:
+        counts = instrument.run_instrumented(
+            args, run_batch, read_jobs(args.jobs, args.format), args.outdir, manifest, args.rate, args.strict,
+            args.message, workers, 32, args.cache, args.sample_format, args.timing, args.raw, args.auto_resolve)
+
+    print('{} ok, {} with warnings, {} rejected - manifest saved as {}'.format(
+        counts['ok'], counts['warning'], counts['error'], manifest_path))
+    if args.cache:
+        print('{} of {} rendered files served from the cache'.format(counts['cached'], counts['ok'] + counts['warning']))
+    return 1 if counts['error'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,230 @@
+# ###    PySame column validation    ###
+#
+# Validates whole columns of header fields at once, for bulk imports where calling
+# check_1 .. check_6 row by row costs more in Python overhead than in checking.
+# Each column is first reduced to its distinct values, which stay Python strings
+# (lengths and upper case come from str itself, as in the per-field functions).
+# They are checked with set membership and with array arithmetic on the code
+# points of the values that have exactly the length a fast path expects:
+#   - originator and event codes: membership in the catalog's code sets
+#   - purge times: digits, hour and minute increments
+#   - issue times: the dd/mm hh:mm layout and day-of-month ranges
+#   - callsigns: length and forbidden characters
+# Anything the fast paths do not decide (event names, location lists, unusual
+# spellings such as non-ASCII digits) goes through the per-field function itself,
+# once per distinct value. The results are then spread back to every row and are
+# identical to calling the per-field functions: same values, codes and messages.
+
+from datetime import datetime as dt, timezone
+import numpy as np
+
+from .catalog import get_catalog
+from .instrument import timed
+from .validate import FIELDS, check_2, check_3, check_4, check_5
+
+_SPECIAL = np.array([ord(c) for c in "!@#$\\%^&*()-+?_=,<>\""], dtype=np.uint32)
+# days per month in 1900, the year strptime assumes for a date without one (so no 29/02)
+_MONTH_DAYS = np.array([0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+
+
+class ColumnResults:
+    # values and messages hold one object array per field (in FIELDS order), codes an int8 array
+    # of shape (6, rows); together they are what check_1 .. check_6 return for every row.
+    # catalog_version is the version of the catalog they were validated against.
+    def __init__(self, values, codes, messages, catalog_version):
+        self.values = values
+        self.codes = codes
+        self.messages = messages
+        self.catalog_version = catalog_version
+
+    def __len__(self):
+        return self.codes.shape[1]
+
+    # Worst code of each row: 0 valid, 1 with warnings, 2 with errors.
+    @property
+    def status(self):
+        return self.codes.max(axis=0)
+
+    # The six (value, code, message) tuples of row i.
+    def row(self, i):
+        return [(self.values[f][i], int(self.codes[f, i]), self.messages[f][i]) for f in range(len(FIELDS))]
+
+    # The validated field values of every row without errors, as create_header takes them.
+    def valid_rows(self):
+        return [[self.values[f][i] for f in range(len(FIELDS))] for i in np.nonzero(self.status < 2)[0]]
+
+
+# Validates six equally long columns of strings (originator, event, location, purge, issue, callsign)
+# against catalog (default: the current one).
+@timed()
+def validate_columns(originator, event, location, purge, issue, callsign, catalog=None):
+    columns = [originator, event, location, purge, issue, callsign]
+    rows = len(columns[0])
+    if any(len(column) != rows for column in columns):
+        raise ValueError('All columns must have the same length')
+
+    catalog = catalog or get_catalog()
+    checks = (_originators, _events, _locations, _purge_times, _issue_times, _callsigns)
+    values = []
+    codes = np.empty((len(FIELDS), rows), dtype=np.int8)
+    messages = []
+    for f, (column, check) in enumerate(zip(columns, checks)):
+        if rows == 0:
+            values.append(np.empty(0, dtype=object))
+            messages.append(np.empty(0, dtype=object))
+            continue
+        uniques, inverse = _distinct(column)
+        u_values, u_codes, u_messages = check(uniques, catalog)
+        values.append(u_values[inverse])
+        codes[f] = u_codes[inverse]
+        messages.append(u_messages[inverse])
+    return ColumnResults(values, codes, messages, catalog.version)
+
+
+# Same as validate_columns, for records (dicts with the FIELDS keys, as read by batch.read_jobs).
+def validate_records(records, catalog=None):
+    return validate_columns(*[[str(record[name]) for record in records] for name in FIELDS], catalog=catalog)
+
+
+# Distinct values of column (as an object array of str) and, for every row, the index of its value.
+def _distinct(column):
+    uniques = list(dict.fromkeys(column))
+    index = {value: i for i, value in enumerate(uniques)}
+    inverse = np.fromiter(map(index.__getitem__, column), dtype=np.intp, count=len(column))
+    distinct = np.empty(len(uniques), dtype=object)
+    distinct[:] = uniques
+    return distinct, inverse
+
+
+def _lengths(uniques):
+    return np.fromiter(map(len, uniques), dtype=np.intp, count=len(uniques))
+
+
+def _upper(uniques):
+    upper = np.empty(len(uniques), dtype=object)
+    upper[:] = [value.upper() for value in uniques]
+    return upper
+
+
+def _member(uniques, keys):
+    return np.fromiter((value in keys for value in uniques), dtype=bool, count=len(uniques))
+
+
+def _empty(uniques):
+    values = uniques.copy()
+    codes = np.zeros(len(uniques), dtype=np.int8)
+    messages = np.full(len(uniques), '', dtype=object)
+    return values, codes, messages
+
+
+# Runs check on the distinct values selected by mask, filling their results in.
+def _fallback(check, uniques, mask, values, codes, messages, catalog):
+    for i in np.nonzero(mask)[0]:
+        values[i], codes[i], messages[i] = check(str(uniques[i]), catalog)
+
+
+# Code points of strings that are all exactly width characters long, one row per string.
+def _code_points(strings, width):
+    return np.array(list(strings), dtype='U{}'.format(width)).view(np.uint32).reshape(-1, width)
+
+
+def _digits(points):
+    return (points >= 48) & (points <= 57)
+
+
+def _originators(uniques, catalog):
+    upper = _upper(uniques)
+    values, codes, messages = _empty(upper)
+    known = _member(upper, catalog.originators)
+    unused = _member(upper, {code for code, (name, unused) in catalog.originators.items() if unused})
+    for i in np.nonzero(~known)[0]:
+        codes[i], messages[i] = 2, upper[i] + ' invalid originator code'
+    for i in np.nonzero(unused)[0]:
+        name = catalog.originators[upper[i]][0]
+        codes[i], messages[i] = 1, 'Originator code {} - {} is no longer in use'.format(upper[i], name)
+    return values, codes, messages
+
+
+def _events(uniques, catalog):
+    values, codes, messages = _empty(uniques)
+    is_code = _lengths(uniques) == 3
+    upper = _upper(uniques)
+    values[is_code] = upper[is_code]
+    known = is_code & _member(upper, catalog.events)
+    unused = known & _member(upper, {code for code, (name, us, lvl) in catalog.events.items() if us == 'NI'})
+    for i in np.nonzero(is_code & ~known)[0]:
+        codes[i], messages[i] = 2, '{} invalid event code'.format(upper[i])
+    for i in np.nonzero(unused)[0]:
+        codes[i], messages[i] = 1, 'Event {} - {} is not in use'.format(upper[i], catalog.events[upper[i]][0])
+    _fallback(check_2, uniques, ~is_code, values, codes, messages, catalog)
+    return values, codes, messages
+
+
+def _locations(uniques, catalog):
+    values, codes, messages = _empty(uniques)
+    _fallback(check_3, uniques, np.ones(len(uniques), dtype=bool), values, codes, messages, catalog)
+    return values, codes, messages
+
+
+def _purge_times(uniques, catalog):
+    values, codes, messages = _empty(uniques)
+    zero = uniques == '0'
+    values[zero] = '0000'
+
+    four = _lengths(uniques) == 4
+    p = _code_points(uniques[four], 4)
+    fast = four.copy()
+    fast[four] = _digits(p).all(axis=1)
+    d = np.zeros((len(uniques), 4), dtype=np.int64)
+    d[four] = p.astype(np.int64) - 48
+    hour = d[:, 0] * 10 + d[:, 1]
+    minute = d[:, 2] * 10 + d[:, 3]
+    errors = [
+        (fast & (hour == 0) & ((minute % 15 != 0) | (minute > 45)),
+         'Purge time under 1 hour must be in 15 minute increments'),
+        (fast & (hour > 0) & (hour < 6) & (minute != 0) & (minute != 30),
+         'Purge time between 1 to 6 hours must be in 30 minute increments'),
+        (fast & (hour >= 6) & (minute != 0), 'Purge time beyond 6 hours must be in 1 hour increments'),
+    ]
+    for mask, message in errors:
+        codes[mask] = 2
+        messages[mask] = message
+    _fallback(check_4, uniques, ~(zero | fast), values, codes, messages, catalog)
+    return values, codes, messages
+
+
+def _issue_times(uniques, catalog):
+    values, codes, messages = _empty(uniques)
+    now = dt.now(timezone.utc).strftime('%j%H%M')
+
+    fast = _lengths(uniques) == 11
+    p = _code_points(uniques[fast], 11)
+    layout = ((p[:, 2] == ord('/')) & (p[:, 5] == ord(' ')) & (p[:, 8] == ord(':'))
+              & _digits(p[:, [0, 1, 3, 4, 6, 7, 9, 10]]).all(axis=1))
+    d = p.astype(np.int64) - 48
+    day = d[:, 0] * 10 + d[:, 1]
+    month = d[:, 3] * 10 + d[:, 4]
+    in_range = ((month >= 1) & (month <= 12) & (day >= 1) & (day <= _MONTH_DAYS[np.clip(month, 0, 12)])
+                & (d[:, 6] * 10 + d[:, 7] <= 23) & (d[:, 9] * 10 + d[:, 10] <= 59))
+    fast[fast] = layout & in_range
+
+    zero = uniques == '0'
+    values[fast | zero] = now
+    _fallback(check_5, uniques, ~(fast | zero), values, codes, messages, catalog)
+    return values, codes, messages
+
+
+def _callsigns(uniques, catalog):
+    values, codes, messages = _empty(uniques)
+    length = _lengths(uniques) == 8
+    codes[~length] = 2
+    messages[~length] = 'Station callsign must be 8 characters long'
+
+    special = np.zeros(len(uniques), dtype=bool)
+    special[length] = np.isin(_code_points(uniques[length], 8), _SPECIAL).any(axis=1)
+    codes[special] = 2
+    messages[special] = 'Station callsign must not contain special characters except for \'/\''
+
+    valid = length & ~special
+    values[valid] = _upper(uniques[valid])
+    return values, codes, messages
@@ -0,0 +1,231 @@
+# ###    PySame benchmarks    ###
+#
+# Times the pipeline stage by stage: the six validators (check_3 with 1 and 31
+# locations; 1000 rows one by one and with validate_columns), create_header,
+# binary_to_signal at several sample rates and header lengths, write_audio_file
+# and complete messages end to end. Every benchmark is
+# run for a fixed wall-clock budget per round over several rounds; the median time
+# per call is the headline number. Peak memory of one call is measured separately
+# with tracemalloc. Results are saved as JSON and can be compared with a baseline
+# from an earlier run, flagging benchmarks that got slower (or hungrier) than the
+# threshold allows. Everything runs offline on synthetic input.
+#
+# usage: pysame-bench [-o results.json] [--baseline old.json] [--threshold 0.1] [--quick] [-k filter]
+
+import argparse
+from datetime import datetime, timezone
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+
+from .assembler import message_blocks
+from .batchvalidate import validate_columns
+from .catalog import get_catalog
+from .header import binary_to_signal, create_header, write_audio_file
+from .validate import CHECKS, check_1, check_2, check_3, check_4, check_5, check_6
+
+RESULTS_FORMAT = 1
+RATES = (8000, 22050, 44100, 48000)
+ROUNDS = 5
+ROUND_TIME = 0.2
+QUICK_ROUND_TIME = 0.02
+DEFAULT_THRESHOLD = 0.10
+# memory growth below this many bytes is never reported
+MEMORY_SLACK = 64 * 1024
+
+FIELDS_1 = ['WXR', 'TOR', 'Albany, NY', '0130', '0', 'KOKX/NWS']
+
+
+# Returns a check_3 input naming count counties of New York.
+def location_input(count):
+    index = get_catalog().fips_index
+    names = sorted(name for code, name in index.county_names.items() if code.startswith('36'))
+    return '. '.join('{}, NY'.format(name) for name in names[:count])
+
+
+# Runs fn for at least round_time seconds, rounds times. Returns the seconds per call of each round.
+def time_calls(fn, rounds=ROUNDS, round_time=ROUND_TIME):
+    fn()
+    number = 1
+    while True:
+        t = time.perf_counter()
+        for i in range(number):
+            fn()
+        elapsed = time.perf_counter() - t
+        if elapsed >= round_time or number >= 1 << 20:
+            break
+        number *= 2 if elapsed <= 0 else max(2, min(10, int(round_time / elapsed * 1.2)))
+
+    times = [elapsed / number]
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for i in range(rounds - 1):
+            t = time.perf_counter()
+            for j in range(number):
+                fn()
+            times.append((time.perf_counter() - t) / number)
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return times, number
+
+
+# Peak memory allocated (in bytes) while fn runs once.
+def peak_memory(fn):
+    # tracing starts here, so the peak begins at the current traced size (no reset_peak, which needs 3.9)
+    tracemalloc.start()
+    try:
+        base = tracemalloc.get_traced_memory()[0]
+        fn()
+        return max(tracemalloc.get_traced_memory()[1] - base, 0)
+    finally:
+        tracemalloc.stop()
+
+
+# Returns the (name, function) pairs to run. Each function performs one call of the benchmarked operation.
+def benchmarks(workdir):
+    get_catalog()
+    loc_1 = location_input(1)
+    loc_31 = location_input(31)
+    short_bits, short_text = create_header(FIELDS_1)
+    long_fields = list(FIELDS_1)
+    long_fields[2] = check_3(loc_31)[0]
+    long_bits, long_text = create_header(long_fields)
+    wav_path = os.path.join(workdir, 'bench.wav')
+    rows = [['WXR', 'TOR', loc_1, '{:02d}00'.format(i % 24), '0', 'KOKX/NWS'] for i in range(1000)]
+    columns = list(zip(*rows))
+
+    items = [
+        ('check_1', lambda: check_1('WXR')),
+        ('check_2', lambda: check_2('Tornado Warning')),
+        ('check_3[1 location]', lambda: check_3(loc_1)),
+        ('check_3[31 locations]', lambda: check_3(loc_31)),
+        ('check_4', lambda: check_4('0130')),
+        ('check_5', lambda: check_5('0')),
+        ('check_6', lambda: check_6('KOKX/NWS')),
+        ('validate_columns[1000 rows]', lambda: validate_columns(*columns)),
+        ('check_1..6[1000 rows]', lambda: [[check(value) for check, value in zip(CHECKS, row)] for row in rows]),
+        ('create_header[1 location]', lambda: create_header(FIELDS_1)),
+        ('create_header[31 locations]', lambda: create_header(long_fields)),
+    ]
+    for rate in RATES:
+        for label, bits in (('1 location', short_bits), ('31 locations', long_bits)):
+            items.append(('binary_to_signal[{} Hz, {}]'.format(rate, label),
+                          lambda bits=bits, rate=rate: binary_to_signal(bits, rate)))
+            items.append(('binary_to_signal[{} Hz, {}, int16]'.format(rate, label),
+                          lambda bits=bits, rate=rate: binary_to_signal(bits, rate, np.int16)))
+
+    signal = binary_to_signal(long_bits, 44100)
+    items.append(('write_audio_file[44100 Hz, 31 locations]', lambda: write_audio_file(wav_path, 44100, signal)))
+
+    raw_fields = ['WXR', 'TOR', loc_31, '0130', '0', 'KOKX/NWS']
+
+    def message():
+        values = [check(raw)[0] for check, raw in zip(CHECKS, raw_fields)]
+        text = create_header(values)[1]
+        write_audio_file(wav_path, 44100, message_blocks(text, 44100, np.int16, attention=0))
+
+    items.append(('message[44100 Hz, 31 locations, end to end]', message))
+    return items
+
+
+# Runs every benchmark whose name contains one of filters (all without filters) and returns the results document.
+def run(filters=None, rounds=ROUNDS, round_time=ROUND_TIME, log=None):
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='pysame-bench-') as workdir:
+        for name, fn in benchmarks(workdir):
+            if filters and not any(f in name for f in filters):
+                continue
+            times, number = time_calls(fn, rounds, round_time)
+            median = statistics.median(times)
+            results[name] = {
+                'median_us': median * 1e6,
+                'min_us': min(times) * 1e6,
+                'mean_us': statistics.mean(times) * 1e6,
+                'stdev_us': statistics.stdev(times) * 1e6 if len(times) > 1 else 0.0,
+                'ops_per_sec': 1 / median if median > 0 else None,
+                'peak_bytes': peak_memory(fn),
+                'calls_per_round': number,
+                'rounds': len(times)
+            }
+            if log is not None:
+                log(_format_result(name, results[name]))
+
+    return {
+        'format': RESULTS_FORMAT,
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'environment': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'machine': platform.machine(),
+            'cpu_count': os.cpu_count()
+        },
+        'settings': {'rounds': rounds, 'round_time': round_time},
+        'results': results
+    }
+
+
+# Compares a results document with a baseline. Returns (name, metric, baseline, current, ratio) for
+# every benchmark whose median time or peak memory grew by more than threshold (0.1 = 10 %).
+def compare(current, baseline, threshold=DEFAULT_THRESHOLD):
+    regressions = []
+    for name, now in current['results'].items():
+        old = baseline.get('results', {}).get(name)
+        if old is None:
+            continue
+        if old['median_us'] > 0 and now['median_us'] > old['median_us'] * (1 + threshold):
+            regressions.append((name, 'median_us', old['median_us'], now['median_us'], now['median_us'] / old['median_us']))
+        if (now['peak_bytes'] > old['peak_bytes'] * (1 + threshold)
+                and now['peak_bytes'] - old['peak_bytes'] > MEMORY_SLACK):
+            ratio = now['peak_bytes'] / old['peak_bytes'] if old['peak_bytes'] else float('inf')
+            regressions.append((name, 'peak_bytes', old['peak_bytes'], now['peak_bytes'], ratio))
+    return regressions
+
+
+def _format_result(name, result):
+    return '{:<48} {:>12.2f} us  {:>12.1f} /s  {:>10.1f} KiB'.format(
+        name, result['median_us'], result['ops_per_sec'] or 0.0, result['peak_bytes'] / 1024)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the pySame pipeline.')
+    parser.add_argument('-o', '--output', default=None, help='save the results as JSON')
+    parser.add_argument('--baseline', default=None, help='results JSON of an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='allowed slowdown before a benchmark is flagged (default 0.10 = 10%%)')
+    parser.add_argument('--quick', action='store_true', help='shorter rounds, for a smoke test')
+    parser.add_argument('-k', '--filter', action='append', default=None, help='only run benchmarks containing this text')
+    args = parser.parse_args(argv)
+
+    print('{:<48} {:>15}  {:>14}  {:>14}'.format('benchmark', 'median', 'throughput', 'peak memory'))
+    results = run(args.filter, round_time=QUICK_ROUND_TIME if args.quick else ROUND_TIME, log=print)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+            f.write('\n')
+        print('Results saved as {}'.format(args.output))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for name, metric, old, new, ratio in regressions:
+            print('REGRESSION {}: {} {:.2f} -> {:.2f} ({:+.1f}%)'.format(name, metric, old, new, (ratio - 1) * 100))
+        if regressions:
+            return 1
+        print('No regressions against {} (threshold {:.0f}%)'.format(args.baseline, args.threshold * 100))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
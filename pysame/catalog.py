@@ -0,0 +1,143 @@
+# ###    PySame catalogs    ###
+#
+# Lazily loaded reference catalogs (originator codes, event codes, FIPS locations
+# and USPS abbreviations). Nothing is read from disk until get_catalog() is first
+# called, so the synthesis side of the package can be imported on its own.
+#
+# A Catalog is never modified after it is built and carries a version (a hash of
+# its contents). reload_catalog() builds a new one when the source files change
+# and swaps it in with a single assignment, so lookups never take a lock: whoever
+# already holds the previous catalog (e.g. a job being validated) keeps using it.
+# A CatalogWatcher polls the source files from a background thread.
+
+import hashlib
+import json
+import sys
+import threading
+
+from .fipsindex import FipsIndex
+from .instrument import stage
+
+
+class Catalog:
+    # data is the plain catalog dict produced by snapshot.load_catalog.
+    def __init__(self, data):
+        self._data = data
+        self._version = None
+        self.originators = data['originators']
+        self.event_list = data['events']
+        self.events = {code: (name, us, lvl) for code, name, us, lvl in self.event_list}
+        self.event_names = {}
+        for code, name, us, lvl in self.event_list:
+            self.event_names.setdefault(name.lower(), code)
+        self.states = data['states']
+        self.state_abvs = data['abvs']
+        self.fips_index = FipsIndex(self.states, self.state_abvs)
+        self._search_indexes = {}
+
+    # Hash of the catalog contents, the same whether they came from the snapshot or the sources.
+    # Computed on first use so that loading stays as fast as possible.
+    @property
+    def version(self):
+        if self._version is None:
+            self._version = hashlib.sha1(json.dumps(self._data, sort_keys=True).encode()).hexdigest()[:12]
+        return self._version
+
+    # Fuzzy search index over 'counties', 'states' or 'events', built on first use (see pysame.search).
+    def search_index(self, kind):
+        index = self._search_indexes.get(kind)
+        if index is None:
+            from .search import build_index
+            index = self._search_indexes[kind] = build_index(self, kind)
+        return index
+
+
+_catalog = None
+# source file stamps (see snapshot.source_stamps) the current catalog was loaded from
+_stamps = None
+_reload_lock = threading.Lock()
+
+DEFAULT_WATCH_INTERVAL = 5.0
+
+
+# Returns the process-wide catalog, loading it on first use.
+def get_catalog():
+    if _catalog is None:
+        with _reload_lock:
+            if _catalog is None:
+                _swap(*_load())
+    return _catalog
+
+
+def _load():
+    from .snapshot import load_catalog, source_stamps
+    stamps = source_stamps()
+    with stage('catalog_load'):
+        return Catalog(load_catalog()), stamps
+
+
+def _swap(catalog, stamps):
+    global _catalog, _stamps
+    _catalog = catalog
+    _stamps = stamps
+
+
+# Loads the catalogs again if their source files changed since the current catalog was
+# loaded (always with force) and makes the result current. prepare(catalog) is called on
+# the new catalog before the swap, e.g. to build its search indexes. Returns the new
+# catalog, or None if nothing changed; an edit that leaves the contents (and so the
+# version) unchanged keeps the current catalog and its warm indexes.
+def reload_catalog(force=False, prepare=None):
+    from .snapshot import source_stamps
+    with _reload_lock:
+        if not force and _catalog is not None and source_stamps() == _stamps:
+            return None
+        catalog, stamps = _load()
+        if _catalog is not None and catalog.version == _catalog.version:
+            _swap(_catalog, stamps)
+            return None
+        if prepare is not None:
+            prepare(catalog)
+        _swap(catalog, stamps)
+        return catalog
+
+
+class CatalogWatcher:
+    # Calls reload_catalog(prepare=prepare) every interval seconds on a daemon thread and
+    # on_reload(catalog) after every swap. Files caught mid-edit (missing or unparsable)
+    # are counted in errors and retried on the next poll.
+    def __init__(self, interval=DEFAULT_WATCH_INTERVAL, prepare=None, on_reload=None):
+        self.interval = interval
+        self.prepare = prepare
+        self.on_reload = on_reload
+        self.reloads = 0
+        self.errors = 0
+        self.last_error = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='pysame-catalog-watcher', daemon=True)
+
+    def start(self):
+        get_catalog()
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                catalog = reload_catalog(prepare=self.prepare)
+            except (OSError, ValueError, SyntaxError, KeyError) as e:
+                self.errors += 1
+                if repr(e) != self.last_error:
+                    print('Catalog reload failed: {!r}'.format(e), file=sys.stderr)
+                self.last_error = repr(e)
+                continue
+            self.last_error = None
+            if catalog is not None:
+                self.reloads += 1
+                if self.on_reload is not None:
+                    self.on_reload(catalog)
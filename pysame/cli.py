@@ -0,0 +1,89 @@
+# ###    ######    ###
+#
+# ###    PySame    ###
+#
+# ###    ######    ###
+#
+# ###  version 1.0
+# 
+# September 1 2022
+# Author: SenorTite
+#
+# DISCLAIMER: PySame is provided for entertainment, educational and demonstrative
+# purposes only, without warranty of any kind, either expressed or implied. By
+# using the software, you hereby consent that you will be solely responsible for
+# any subsequent event or action taking place from any usage of EAS tones generated
+# during such use. The software and its author are not affiliated, approved by, or
+# otherwise related to any organization or authority which uses or implements the
+# Specific Area Message Encoding protocol (SAME) for official purposes. UNDER NO
+# CIRCUMSTANCE SHALL THE AUTHOR OF THE SOFTWARE BE ACCOUNTABLE FOR ANY LOSS OR
+# DAMAGE OR HAVE ANY OTHERWISE VALID LIABILITY ASSOCIATED IN ANY WAY WITH USAGE OF
+# EAS TONES GENERATED USING THE SOFTWARE.
+#
+# Interactive prompt: asks for the six header fields and saves the header as a WAV file.
+#
+
+from datetime import datetime as dt
+import numpy as np
+
+from .glyphcache import render_header
+from .header import create_header, write_audio_file
+from .validate import check_1, check_2, check_3, check_4, check_5, check_6, stages
+
+
+def main_loop():
+    rtrnfinal = []
+    rtrn = ''
+    res = 0
+    msg = ''
+    i = 0
+
+    while i < 6:
+        print("{}: - {} - Enter value: ".format(str(i + 1), stages[i + 1]), end='')
+        instri = input()
+        if i == 0:
+            rtrn, res, msg = check_1(instri)
+        elif i == 1:
+            rtrn, res, msg = check_2(instri)
+        elif i == 2:
+            rtrn, res, msg = check_3(instri)
+        elif i == 3:
+            rtrn, res, msg = check_4(instri)
+        elif i == 4:
+            rtrn, res, msg = check_5(instri)
+        elif i == 5:
+            rtrn, res, msg = check_6(instri)
+        
+        if res == 0:
+            rtrnfinal.append(rtrn)
+            i += 1
+            print()
+        elif res == 1:
+            print('WARNING: {}\nWould you still like to proceed? (Y for yes, enter to revert)'.format(msg), end='')
+            instri = input()
+            if instri == 'y' or instri == 'Y':
+                rtrnfinal.append(rtrn)
+                i += 1
+            print()
+        elif res == 2:
+            print('ERROR: {} - Please try again.'.format(msg))
+    
+    return rtrnfinal
+
+
+def main():
+    print("Welcome to PySame\nRefer to README for instructions.\n")
+    mylist = main_loop()
+
+    binaryData, stringData = create_header(mylist)
+    aud = render_header(stringData, 44100, np.int16)
+    filename = dt.now().strftime("SAME %Y%m%d %H%M%S.wav")
+
+    print('Header created - {}\nPress Enter to save as WAV file . . .'.format(stringData))
+    input()
+    write_audio_file(filename, 44100, aud)
+    print("File saved as {}".format(filename))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+# ###    PySame compilations    ###
+#
+# Renders long archives (compliance logs, test reels) that chain many complete
+# messages with silence between them into a single WAV file. The timeline is laid
+# out up front from message_length, so every message's position in the file is
+# known before anything is rendered. The output file is preallocated at its final
+# size with a complete header, and each message is rendered block by block
+# straight into its own np.memmap slice. Slices do not overlap, so they are filled
+# in parallel by a process pool. Memory use depends on the longest message, not
+# on the length of the archive.
+#
+# usage: pysame-compile jobs.jsonl -o archive.wav [-r rate] [-s pcm16|float32|ulaw] [--timing legacy|exact]
+#                       [--spacing seconds] [--attention seconds] [-j workers]
+
+from collections import namedtuple
+import os
+import sys
+import numpy as np
+
+from .assembler import GAP, message_blocks, message_length
+from .formats import get_format
+from .pool import render_pool, worker_settings
+from .synthesis import convert_samples, tone_table
+from .wavstream import HEADER_SIZE, UNKNOWN_SIZE, wav_header
+
+DEFAULT_SPACING = 5.0
+
+# header: the message's header text, start: its first sample in the archive, length: samples of
+# the message, pad: samples of silence after it (up to the next message).
+Slot = namedtuple('Slot', 'header start length pad')
+# The render_slot arguments shared by every slot of an archive.
+SlotSettings = namedtuple('SlotSettings', 'path sample_rate fmt attention gap timing renderer')
+
+
+# Lays out headers (texts from create_header) one after another, spacing seconds apart.
+# Returns the slots and the total length of the archive in samples.
+def plan_compilation(headers, sample_rate=44100, spacing=DEFAULT_SPACING, attention=0.0, gap=GAP, timing='legacy'):
+    spacing_samples = int(spacing * sample_rate)
+    slots = []
+    start = 0
+    for header in headers:
+        length = message_length(header, sample_rate, attention, None, gap, timing)
+        if slots:
+            slots[-1] = slots[-1]._replace(pad=spacing_samples)
+            start += spacing_samples
+        slots.append(Slot(header, start, length, 0))
+        start += length
+    return slots, start
+
+
+# Renders every header as a complete message into one WAV file at path. fmt is a sample
+# format name (pcm16, float32, ulaw); attention, gap, timing and renderer are passed to
+# message_blocks. workers > 1 fills the slots on a process pool. Returns the slots.
+def compile_archive(path, headers, sample_rate=44100, fmt='pcm16', spacing=DEFAULT_SPACING, attention=0.0, gap=GAP,
+                    timing='legacy', renderer='table', workers=1):
+    fmt = get_format(fmt)
+    slots, samples = plan_compilation(headers, sample_rate, spacing, attention, gap, timing)
+    data_size = samples * fmt.dtype.itemsize
+    if HEADER_SIZE - 8 + data_size + (data_size & 1) >= UNKNOWN_SIZE:
+        raise ValueError('The archive is too long for a WAV file ({} samples)'.format(samples))
+    with open(path, 'wb') as f:
+        f.write(wav_header(sample_rate, fmt, data_size))
+        f.truncate(HEADER_SIZE + data_size + (data_size & 1))
+
+    settings = SlotSettings(path, sample_rate, fmt.name, attention, gap, timing, renderer)
+    if workers > 1 and len(slots) > 1:
+        tone_table(sample_rate, fmt, timing)
+        with render_pool(workers, settings) as pool:
+            pool.map(_pool_slot, slots, chunksize=1)
+    else:
+        for slot in slots:
+            render_slot(slot, *settings)
+    return slots
+
+
+# Renders one slot's message (and its trailing silence, where silence is not zero bytes) into the file.
+def render_slot(slot, path, sample_rate, fmt, attention=0.0, gap=GAP, timing='legacy', renderer='table'):
+    fmt = get_format(fmt)
+    dtype = fmt.dtype.newbyteorder('<')
+    out = np.memmap(path, dtype=dtype, mode='r+', offset=HEADER_SIZE + slot.start * dtype.itemsize,
+                    shape=(slot.length + slot.pad,))
+    try:
+        pos = 0
+        for block in message_blocks(slot.header, sample_rate, fmt, attention=attention, gap=gap, timing=timing,
+                                    renderer=renderer):
+            out[pos:pos + len(block)] = block
+            pos += len(block)
+        if pos != slot.length:
+            raise ValueError('Message {} rendered to {} samples, {} were planned'.format(slot.header, pos, slot.length))
+        silence = convert_samples(np.zeros(1), fmt)
+        if slot.pad and silence.view(np.uint8).any():
+            out[pos:] = silence[0]
+        out.flush()
+    finally:
+        del out
+    return slot.length
+
+
+def _pool_slot(slot):
+    return render_slot(slot, *worker_settings())
+
+
+def main(argv=None):
+    import argparse
+
+    from .batch import read_jobs, validate_job
+    from .formats import TIMINGS
+    from .header import create_header
+
+    parser = argparse.ArgumentParser(description='Render many SAME messages into one long WAV file.')
+    parser.add_argument('jobs', help='job file (.jsonl or .csv) with the six header fields per record')
+    parser.add_argument('-o', '--output', required=True, help='archive WAV file')
+    parser.add_argument('-r', '--rate', type=int, default=44100, help='sample rate')
+    parser.add_argument('-s', '--sample-format', choices=('pcm16', 'float32', 'ulaw'), default='pcm16')
+    parser.add_argument('--timing', choices=TIMINGS, default='legacy', help='bit timing (exact avoids baud drift)')
+    parser.add_argument('--spacing', type=float, default=DEFAULT_SPACING, help='seconds of silence between messages')
+    parser.add_argument('--attention', type=float, default=0.0, help='attention tone length in seconds')
+    parser.add_argument('-j', '--workers', type=int, default=1, help='worker processes (0 = one per CPU)')
+    args = parser.parse_args(argv)
+
+    headers = []
+    for row, record in enumerate(read_jobs(args.jobs), 1):
+        values, warnings, errors = validate_job(record)
+        for message in errors:
+            print('Record {}: {}'.format(row, message), file=sys.stderr)
+        if values is not None:
+            headers.append(create_header(values)[1])
+    if not headers:
+        print('No valid records', file=sys.stderr)
+        return 1
+
+    slots = compile_archive(args.output, headers, args.rate, args.sample_format, args.spacing, args.attention,
+                            timing=args.timing, workers=args.workers or os.cpu_count() or 1)
+    seconds = (slots[-1].start + slots[-1].length) / args.rate
+    print('{} messages, {:.1f} s - archive saved as {}'.format(len(slots), seconds, args.output))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,328 @@
+# ###    PySame decoder    ###
+#
+# Streaming SAME demodulator, the inverse of binary_to_signal. Each block of audio
+# is mixed against the mark and space tones and integrated over one bit with a
+# moving sum (all NumPy), giving a soft mark/space decision per sample. Bits are
+# then sampled with a clock that re-centres itself on every mark/space transition,
+# framed by the 0xAB preamble and parsed into ZCZC headers and NNNN end-of-message
+# markers. Audio can be fed in chunks of any size.
+#
+# Where neither tone is present at all (digital silence, as between the bursts of
+# a rendered file) there is nothing to decide or to time: the clock ignores those
+# samples and, when a burst starts out of such silence, restarts on its first bit
+# instead of taking the edge of the burst for a mark/space transition.
+#
+# usage: python -m pysame.decoder file.wav     decode a 16-bit, float or mu-law WAV file
+#        python -m pysame.decoder --bench      report audio-seconds decoded per CPU-second
+#        python -m pysame.decoder --roundtrip  render and decode messages separated by silence of many lengths
+
+from collections import deque, namedtuple
+import itertools
+import sys
+import time
+import numpy as np
+
+from .formats import BIT_LENGTH, ulaw_decode
+from .header import parse_header
+from .wavstream import read_blocks
+
+MARK_FREQ = 4000.0 / BIT_LENGTH
+SPACE_FREQ = 3000.0 / BIT_LENGTH
+
+# total tone power below this counts as no carrier
+CARRIER_FLOOR = 1e-12
+
+PREAMBLE_BYTE = 0xAB
+MIN_PREAMBLE = 4
+MAX_HEADER_LENGTH = 268
+EOM = 'NNNN'
+
+# text: the decoded string, fields: the six header fields (None for NNNN),
+# start / end: absolute sample positions of the first and last character.
+SameMessage = namedtuple('SameMessage', 'text fields start end')
+
+_HUNT, _PREAMBLE, _MESSAGE = range(3)
+
+
+class Decoder:
+    # samples_per_bit defaults to the nominal 1.92 ms bit; the clock tracks small rate offsets.
+    def __init__(self, sample_rate, samples_per_bit=None):
+        self.sample_rate = sample_rate
+        self.nominal_period = samples_per_bit or BIT_LENGTH * sample_rate / 1000
+        self.window = int(round(self.nominal_period))
+        self._w = 2.0 * np.pi * np.array([MARK_FREQ, SPACE_FREQ]) / sample_rate
+        self._phase = np.zeros(2)
+        self._tail = np.zeros((2, self.window), dtype=complex)
+
+        self.samples = 0
+        self._soft = np.zeros(0)
+        self._carrier = np.zeros(0, dtype=bool)
+        self._soft_start = 0
+        self._had_carrier = False
+        self._onsets = deque()
+
+        self.period = self.nominal_period
+        self._next = self.period - 1
+        self._last_point = None
+        self._last_bit = 0
+
+        self._state = _HUNT
+        self._reg = 0
+        self._nbits = 0
+        self._byte = 0
+        self._count = 0
+        self._text = []
+        self._start = 0
+        self._plus = False
+        self._dashes = 0
+
+    # Feeds a chunk of samples (float in [-1, 1], integer PCM or uint8 mu-law) and returns the messages completed by it.
+    def feed(self, chunk):
+        chunk = np.asarray(chunk)
+        if chunk.dtype == np.uint8:
+            chunk = ulaw_decode(chunk)
+        if chunk.dtype.kind in 'iu':
+            chunk = chunk.astype(np.float64)
+        if len(chunk) == 0:
+            return []
+
+        soft, carrier = self._demodulate(chunk)
+        starts = np.nonzero(carrier[1:] & ~carrier[:-1])[0] + 1
+        if carrier[0] and not self._had_carrier:
+            starts = np.concatenate([[0], starts])
+        self._onsets.extend((starts + self.samples).tolist())
+        self._had_carrier = bool(carrier[-1])
+        self._soft = np.concatenate([self._soft, soft])
+        self._carrier = np.concatenate([self._carrier, carrier])
+        self.samples += len(chunk)
+        messages = self._sample_bits()
+
+        keep = int(self._next - 2 * self.period) - self._soft_start
+        if keep > 0:
+            self._soft = self._soft[keep:]
+            self._carrier = self._carrier[keep:]
+            self._soft_start += keep
+        return messages
+
+    # Mixes the chunk down against both tones and returns the soft decision for each sample,
+    # and whether there is any carrier (tone power) in its window.
+    def _demodulate(self, chunk):
+        n = np.arange(len(chunk))
+        angles = self._w[:, None] * n + self._phase[:, None]
+        mixed = chunk * np.exp(-1j * angles)
+        self._phase = (self._phase + self._w * len(chunk)) % (2.0 * np.pi)
+
+        joined = np.concatenate([self._tail, mixed], axis=1)
+        c = np.cumsum(joined, axis=1)
+        sums = c[:, self.window:] - c[:, :-self.window]
+        self._tail = joined[:, -self.window:]
+
+        power = sums.real ** 2 + sums.imag ** 2
+        total = power[0] + power[1]
+        return (power[0] - power[1]) / np.maximum(total, CARRIER_FLOOR), total > CARRIER_FLOOR
+
+    def _sample_bits(self):
+        messages = []
+        end = self._soft_start + len(self._soft)
+        while int(round(self._next)) < end:
+            point = int(round(self._next))
+            if self._onsets and self._onsets[0] <= point:
+                # the carrier came back after silence: bursts start on a bit boundary, so
+                # sample the first bit once its window is full
+                self._next = self._onsets.popleft() + self.nominal_period - 1
+                self.period = self.nominal_period
+                self._last_point = None
+                continue
+            value = self._soft[point - self._soft_start]
+            bit = 1 if value > 0 else 0
+
+            if self._last_point is not None and bit != self._last_bit:
+                lo = max(self._last_point - self._soft_start, 0)
+                seg = self._soft[lo:point - self._soft_start + 1]
+                flips = np.nonzero((seg[:-1] > 0) != (seg[1:] > 0))[0]
+                if len(flips) and self._carrier[lo:point - self._soft_start + 1].all():
+                    i = flips[0]
+                    a, b = seg[i], seg[i + 1]
+                    crossing = self._soft_start + lo + i + (a / (a - b) if a != b else 0.5)
+                    err = crossing - (self._next - self.period / 2)
+                    self._next += 0.5 * err
+                    self.period += 0.02 * err
+                    self.period = min(max(self.period, 0.97 * self.nominal_period), 1.03 * self.nominal_period)
+
+            self._last_point = point
+            self._last_bit = bit
+            self._next += self.period
+
+            message = self._push_bit(bit, point)
+            if message is not None:
+                messages.append(message)
+        return messages
+
+    def _push_bit(self, bit, point):
+        if self._state == _HUNT:
+            self._reg = (self._reg >> 1) | (bit << 7)
+            if self._reg == PREAMBLE_BYTE:
+                self._state = _PREAMBLE
+                self._count = 1
+                self._nbits = 0
+                self._byte = 0
+            return None
+
+        self._byte |= bit << self._nbits
+        self._nbits += 1
+        if self._nbits < 8:
+            return None
+        byte = self._byte
+        self._nbits = 0
+        self._byte = 0
+        return self._push_byte(byte, point)
+
+    def _push_byte(self, byte, point):
+        if self._state == _PREAMBLE:
+            if byte == PREAMBLE_BYTE:
+                self._count += 1
+                return None
+            if self._count >= MIN_PREAMBLE and chr(byte) in 'ZN':
+                self._state = _MESSAGE
+                self._text = []
+                self._start = point - 8 * self.period
+                self._plus = False
+                self._dashes = 0
+            else:
+                self._reset()
+                return None
+
+        c = chr(byte)
+        text = self._text
+        text.append(c)
+        n = len(text)
+        if byte < 32 or byte > 126 or n > MAX_HEADER_LENGTH:
+            self._reset()
+            return None
+
+        prefix = 'ZCZC-' if text[0] == 'Z' else EOM
+        if n <= len(prefix):
+            s = ''.join(text)
+            if s != prefix[:n]:
+                self._reset()
+            elif s == EOM:
+                self._reset()
+                return SameMessage(EOM, None, int(self._start), point)
+            return None
+
+        if c == '+':
+            self._plus = True
+        elif c == '-' and self._plus:
+            self._dashes += 1
+            if self._dashes == 3:
+                s = ''.join(text)
+                self._reset()
+                fields = parse_header(s)
+                if fields is None:
+                    return None
+                return SameMessage(s, fields, int(self._start), point)
+        return None
+
+    # Pushes one bit of silence through so that a burst ending exactly at the end
+    # of the stream is completed. Returns the messages completed by it.
+    def flush(self):
+        return self.feed(np.zeros(2 * self.window))
+
+    def _reset(self):
+        self._state = _HUNT
+        self._reg = 0
+        self._text = []
+
+
+# Decodes a whole signal (or an iterable of chunks) and returns every message found.
+def decode(audio, sample_rate, samples_per_bit=None):
+    decoder = Decoder(sample_rate, samples_per_bit)
+    if isinstance(audio, np.ndarray):
+        signal = audio
+        audio = (signal[i:i + 65536] for i in range(0, len(signal), 65536))
+    messages = []
+    for chunk in audio:
+        messages.extend(decoder.feed(chunk))
+    messages.extend(decoder.flush())
+    return messages
+
+
+# Decodes a synthetic activation repeatedly and reports audio-seconds processed per CPU-second.
+def bench(sample_rate=44100, seconds=60.0, block_size=4096):
+    from .assembler import message_blocks
+
+    header = 'ZCZC-WXR-TOR-036005-036047-036061-036081-036085+0100-2911033-KOKX/NWS-'
+    signal = np.concatenate(list(message_blocks(header, sample_rate, np.int16, block_size, attention=8.0)))
+    rounds = max(1, int(round(seconds * sample_rate / len(signal))))
+
+    found = 0
+    t = time.process_time()
+    for i in range(rounds):
+        decoder = Decoder(sample_rate)
+        for j in range(0, len(signal), block_size):
+            found += len(decoder.feed(signal[j:j + block_size]))
+        found += len(decoder.flush())
+    elapsed = time.process_time() - t
+
+    audio_seconds = rounds * len(signal) / sample_rate
+    print('{} Hz, {}-sample blocks: {:.1f} s of audio in {:.3f} CPU-s = {:.1f} audio-seconds per CPU-second ({} messages)'.format(
+        sample_rate, block_size, audio_seconds, elapsed, audio_seconds / elapsed, found))
+    return audio_seconds / elapsed
+
+
+# Renders two activations separated by digital silence of lengths different sample counts
+# long (as in rendered files and archives) and decodes them again, in every sample format.
+# Returns (sample_rate, format, silence, messages found) for every case that did not decode completely.
+def roundtrip(sample_rates=(8000, 22050, 44100), lengths=40, timing='legacy'):
+    from .assembler import message_blocks
+    from .formats import get_format
+    from .synthesis import convert_samples
+
+    header = 'ZCZC-WXR-TOR-036005-036047-036061-036081-036085+0100-2911033-KOKX/NWS-'
+    expected = [header] * 3 + [EOM] * 3
+    failures = []
+    for sample_rate in sample_rates:
+        for fmt in ('pcm16', 'float32', 'ulaw'):
+            one = np.concatenate(list(message_blocks(header, sample_rate, fmt, attention=0, timing=timing)))
+            silence = convert_samples(np.zeros(2 * sample_rate), get_format(fmt))
+            for i in range(lengths):
+                gap = sample_rate + i * (sample_rate // lengths + 7)
+                found = [m.text for m in decode(np.concatenate([one, silence[:gap], one]), sample_rate)]
+                if found != expected * 2:
+                    failures.append((sample_rate, fmt, gap, len(found)))
+    return failures
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Decode SAME headers from a WAV file.')
+    parser.add_argument('file', nargs='?', help='WAV file to decode (- for stdin)')
+    parser.add_argument('--bench', action='store_true', help='report decoding speed on a synthetic message')
+    parser.add_argument('--roundtrip', action='store_true', help='check that rendered messages decode after any silence')
+    parser.add_argument('-r', '--rate', type=int, default=44100, help='sample rate for --bench')
+    args = parser.parse_args(argv)
+
+    if args.roundtrip:
+        failures = roundtrip()
+        for sample_rate, fmt, gap, found in failures:
+            print('{} Hz {}, {} samples of silence: {} of 12 messages decoded'.format(sample_rate, fmt, gap, found))
+        print('{} failures'.format(len(failures)))
+        return 1 if failures else 0
+
+    if args.bench or args.file is None:
+        bench(args.rate)
+        return 0
+
+    source = sys.stdin.buffer if args.file == '-' else args.file
+    sample_rate, blocks = read_blocks(source)
+    decoder = Decoder(sample_rate)
+    for chunk in itertools.chain(blocks, [None]):
+        messages = decoder.flush() if chunk is None else decoder.feed(chunk)
+        for message in messages:
+            print('{:10.3f}s  {}'.format(message.start / sample_rate, message.text))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,181 @@
+# ###    PySame render cache    ###
+#
+# Content-addressed on-disk cache of finished WAV blobs, shared by every process
+# pointed at the same directory. Entries are keyed by a SHA-256 of the header
+# string plus the render parameters, written atomically (temp file + rename) and
+# evicted least-recently-used first once the cache exceeds its size limit. A hit
+# can be returned as bytes or as a read-only memory map of the file.
+#
+# The size of the whole directory is kept in its lock file and updated under the
+# lock on every store, so all processes sharing the directory enforce one limit
+# together. Eviction rescans the directory and corrects that total.
+
+from contextlib import contextmanager
+import hashlib
+import json
+import mmap
+import os
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+SUFFIX = '.wav'
+LOCK_FILE = '.lock'
+
+
+# Cache key for a header string and its render parameters (sample rate, format, layout, ...).
+def cache_key(header, **params):
+    raw = json.dumps({'header': header, 'params': params}, sort_keys=True)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class DiskCache:
+    def __init__(self, root, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        os.makedirs(root, exist_ok=True)
+        with self._locked() as lock:
+            self._size = self._read_size(lock)
+
+    def path(self, key):
+        return os.path.join(self.root, key[:2], key + SUFFIX)
+
+    # Returns the cached blob as bytes (or a read-only mmap with use_mmap), or None on a miss.
+    # A hit refreshes the entry's modification time, which drives LRU eviction.
+    def get(self, key, use_mmap=False):
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as f:
+                if use_mmap:
+                    data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                else:
+                    data = f.read()
+        except (FileNotFoundError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return data
+
+    # Stores a blob and evicts old entries if the cache is over its limit. Returns the entry's path.
+    def put(self, key, data):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        with self._locked() as lock:
+            try:
+                replaced = os.stat(path).st_size
+            except FileNotFoundError:
+                replaced = 0
+            os.replace(tmp, path)
+            self.stores += 1
+            size = self._read_size(lock) + len(data) - replaced
+            if size > self.max_bytes:
+                size = self._evict()
+            self._write_size(lock, size)
+        return path
+
+    # Returns the blob for header/params from the cache, calling render() to produce and store it on a miss.
+    def get_or_render(self, header, render, use_mmap=False, **params):
+        key = cache_key(header, **params)
+        data = self.get(key, use_mmap)
+        if data is None:
+            data = render()
+            self.put(key, data)
+        return data
+
+    # Removes least recently used entries until the cache fits in max_bytes.
+    def evict(self):
+        with self._locked() as lock:
+            self._write_size(lock, self._evict())
+
+    def clear(self):
+        with self._locked() as lock:
+            for path, st in self._entries():
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            self._write_size(lock, 0)
+
+    # Holds the directory's lock file, exclusively between processes where flock is available.
+    @contextmanager
+    def _locked(self):
+        with open(os.path.join(self.root, LOCK_FILE), 'a+') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            yield lock
+
+    # The directory's total size as recorded in the lock file, scanned if it was never recorded.
+    def _read_size(self, lock):
+        lock.seek(0)
+        try:
+            self._size = int(lock.read())
+        except ValueError:
+            self._size = self._scan_size()
+            self._write_size(lock, self._size)
+        return self._size
+
+    def _write_size(self, lock, size):
+        lock.seek(0)
+        lock.truncate()
+        lock.write(str(size))
+        lock.flush()
+        self._size = size
+
+    # Evicts with the lock held and returns the size left in the directory.
+    def _evict(self):
+        entries = []
+        total = 0
+        for path, st in self._entries():
+            entries.append((st.st_mtime_ns, st.st_size, path))
+            total += st.st_size
+        entries.sort()
+        for mtime, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            self.evictions += 1
+        return total
+
+    def _entries(self):
+        for sub in os.scandir(self.root):
+            if not sub.is_dir():
+                continue
+            for entry in os.scandir(sub.path):
+                if entry.name.endswith(SUFFIX):
+                    try:
+                        yield entry.path, entry.stat()
+                    except FileNotFoundError:
+                        pass
+
+    def _scan_size(self):
+        return sum(st.st_size for path, st in self._entries())
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+            'stores': self.stores,
+            'evictions': self.evictions,
+            'bytes': self._size,
+            'max_bytes': self.max_bytes
+        }
@@ -0,0 +1,72 @@
+# ###    PySame FIPS location index    ###
+#
+# Dictionary index over the FIPS catalog (fips.xml + uspsAbs.json), built once so
+# that check_3 resolves each location with constant-time lookups instead of scanning
+# the XML tree. Also maps 6-digit PSSCCC codes back to readable names.
+
+NATIONWIDE = '000000'
+
+
+# Converts the fips.xml root into plain (state id, state name, [(county id, county name)]) tuples.
+def states_from_xml(root):
+    return [(state.attrib['id'], state.attrib['name'], [(cty.attrib['id'], cty.text) for cty in state])
+            for state in root]
+
+
+class FipsIndex:
+    # states is an iterable of (state id, state name, [(county id, county name), ...]),
+    # state_abvs maps USPS abbreviations to state names.
+    def __init__(self, states, state_abvs):
+        self.by_name = {}
+        self.by_id = {}
+        self.counties = {}
+        self.county_names = {}
+        self.county_ids = {}
+
+        for state_id, state_name, counties in states:
+            self.by_name.setdefault(state_name.lower(), (state_id, state_name))
+            self.by_id.setdefault(state_id, state_name)
+            self.county_ids.setdefault(state_id, set()).update(county_id for county_id, county_name in counties)
+            for county_id, county_name in counties:
+                # first match wins, as with the linear scan
+                self.counties.setdefault((county_name.lower(), state_id), county_id)
+                self.county_names.setdefault(state_id + county_id, county_name)
+
+        self.by_abv = {}
+        for abv, state_name in state_abvs.items():
+            state = self.by_name.get(state_name.lower())
+            if state is not None:
+                self.by_abv[abv] = state
+
+    # (state id, state name) for a USPS abbreviation, or None.
+    def state_by_abv(self, abv):
+        return self.by_abv.get(abv.upper())
+
+    # (state id, state name) for a full state name (case-insensitive), or None.
+    def state_by_name(self, name):
+        return self.by_name.get(name.lower())
+
+    # County id within the given state (case-insensitive), or None.
+    def county(self, county_name, state_id):
+        return self.counties.get((county_name.lower(), state_id))
+
+    # Readable name for a 6-digit PSSCCC location code, or None if the code is unknown.
+    def lookup(self, code):
+        if len(code) != 6 or not code.isdigit():
+            return None
+        if code == NATIONWIDE:
+            return 'United States'
+        state_id = code[1:3]
+        state_name = self.by_id.get(state_id)
+        if state_name is None:
+            return None
+        if code[3:] == '000':
+            return state_name
+        county_name = self.county_names.get(code[1:])
+        if county_name is None:
+            return None
+        return '{}, {}'.format(county_name, state_name)
+
+    # Readable names for a header location field such as '036061-036005'.
+    def describe(self, location_field):
+        return [self.lookup(code) or code for code in location_field.split('-')]
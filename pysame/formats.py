@@ -0,0 +1,144 @@
+# ###    PySame sample formats    ###
+#
+# Output sample types and bit timing. Tone tables are built per (sample rate,
+# format), so every format is synthesized directly from its own table rather than
+# converted from a float64 signal afterwards.
+#
+#   float64  reference float samples in [-1, 1]
+#   float32  32-bit IEEE float (WAV format 3)
+#   pcm16    16-bit signed PCM (WAV format 1), scaled like the original writer
+#   ulaw     8-bit G.711 mu-law (WAV format 7), for 8 kHz telephony chains
+#
+# A bit lasts 1.92 ms. The original renderer uses int(1.92 * rate / 1000) samples
+# per bit, which truncates at every common rate and makes the signal run fast
+# (2.3 % at 8 kHz). "legacy" timing keeps that, bit for bit. "exact" timing starts
+# bit i at round(i * 1.92 * rate / 1000) so the baud rate is exact over any length.
+
+from collections import namedtuple
+import numpy as np
+
+BIT_LENGTH = 1.92
+BAUD = 1000 / BIT_LENGTH
+
+# Longest burst: 16 preamble bytes plus a 268 character header.
+MAX_BURST_BITS = (16 + 268) * 8
+
+TIMINGS = ('legacy', 'exact')
+
+# Legacy timing this far off 520.83 baud (8 and 16 kHz are 2.3 % fast) is flagged.
+DRIFT_TOLERANCE = 0.01
+COMMON_RATES = (8000, 11025, 16000, 22050, 32000, 44100, 48000, 96000)
+
+SampleFormat = namedtuple('SampleFormat', 'name dtype wav_tag')
+
+FORMATS = {
+    'float64': SampleFormat('float64', np.dtype(np.float64), None),
+    'float32': SampleFormat('float32', np.dtype('<f4'), 3),
+    'pcm16': SampleFormat('pcm16', np.dtype('<i2'), 1),
+    'ulaw': SampleFormat('ulaw', np.dtype(np.uint8), 7)
+}
+
+_by_dtype = {fmt.dtype: fmt for fmt in FORMATS.values()}
+
+ULAW_BIAS = 0x84
+ULAW_CLIP = 32635
+
+
+# Looks up a format by name, by NumPy dtype (uint8 means mu-law) or returns a SampleFormat unchanged.
+def get_format(fmt):
+    if isinstance(fmt, SampleFormat):
+        return fmt
+    if isinstance(fmt, str) and fmt in FORMATS:
+        return FORMATS[fmt]
+    try:
+        return _by_dtype[np.dtype(fmt).newbyteorder('<')]
+    except (TypeError, KeyError):
+        raise ValueError('Unknown sample format {}'.format(fmt))
+
+
+# Converts float samples in [-1, 1] to fmt. Integer formats scale by 32767 and truncate,
+# the same way the original writer produced its int16 samples.
+def encode(audio, fmt):
+    fmt = get_format(fmt)
+    if fmt.name == 'pcm16':
+        return (audio * 32767).astype(fmt.dtype)
+    if fmt.name == 'ulaw':
+        return ulaw_encode((audio * 32767).astype(np.int16))
+    return audio.astype(fmt.dtype)
+
+
+# Converts samples of fmt back to float64 in [-1, 1].
+def decode(samples, fmt):
+    fmt = get_format(fmt)
+    if fmt.name == 'pcm16':
+        return samples / 32767
+    if fmt.name == 'ulaw':
+        return ulaw_decode(samples) / 32767
+    return samples.astype(np.float64)
+
+
+# G.711 mu-law compression of 16-bit linear samples.
+def ulaw_encode(pcm):
+    pcm = np.asarray(pcm, dtype=np.int32)
+    sign = np.where(pcm < 0, 0x80, 0)
+    mag = np.minimum(np.abs(pcm), ULAW_CLIP) + ULAW_BIAS
+    exponent = np.clip(np.frexp(mag)[1] - 8, 0, 7)
+    mantissa = (mag >> (exponent + 3)) & 0x0F
+    return (~(sign | (exponent << 4) | mantissa) & 0xFF).astype(np.uint8)
+
+
+# G.711 mu-law expansion to 16-bit linear samples.
+def ulaw_decode(codes):
+    codes = ~np.asarray(codes, dtype=np.int32) & 0xFF
+    exponent = (codes >> 4) & 0x07
+    mag = ((((codes & 0x0F) << 3) + ULAW_BIAS) << exponent) - ULAW_BIAS
+    return np.where(codes & 0x80, -mag, mag).astype(np.int16)
+
+
+# Samples per bit: the truncated integer used by legacy timing, or the exact fractional length.
+def bit_samples(sample_rate, timing='legacy'):
+    if timing == 'legacy':
+        return int(BIT_LENGTH * sample_rate / 1000)
+    if timing == 'exact':
+        return BIT_LENGTH * sample_rate / 1000
+    raise ValueError('Unknown bit timing {}'.format(timing))
+
+
+# First sample of every bit (plus the end of the last one) for nbits bits.
+def bit_starts(nbits, sample_rate, timing='legacy'):
+    spb = bit_samples(sample_rate, timing)
+    if timing == 'legacy':
+        return np.arange(nbits + 1) * spb
+    return np.floor(np.arange(nbits + 1) * spb + 0.5).astype(np.intp)
+
+
+# Relative baud rate error of legacy timing at sample_rate (positive means the signal runs fast).
+def baud_drift(sample_rate):
+    exact = bit_samples(sample_rate, 'exact')
+    return (exact - bit_samples(sample_rate)) / exact
+
+
+# How many bits legacy timing has slipped by the end of a maximum-length burst.
+def burst_slip(sample_rate):
+    return MAX_BURST_BITS * baud_drift(sample_rate)
+
+
+# True when legacy timing is more than DRIFT_TOLERANCE off the nominal baud rate.
+def drifts(sample_rate):
+    return abs(baud_drift(sample_rate)) > DRIFT_TOLERANCE
+
+
+# One row per sample rate: exact and legacy samples per bit, the legacy baud rate and its slip per burst.
+def drift_report(rates=COMMON_RATES):
+    rows = []
+    for rate in rates:
+        legacy = bit_samples(rate)
+        rows.append({
+            'rate': rate,
+            'exact_samples_per_bit': bit_samples(rate, 'exact'),
+            'legacy_samples_per_bit': legacy,
+            'legacy_baud': rate / legacy if legacy else None,
+            'slip_bits': burst_slip(rate),
+            'drifts': drifts(rate)
+        })
+    return rows
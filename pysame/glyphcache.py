@@ -0,0 +1,109 @@
+# ###    PySame glyph cache    ###
+#
+# A SAME header is the 16-byte 0xAB preamble followed by a short ASCII string, and
+# every byte always renders to the same 8-bit waveform. The cache keeps the rendered
+# waveform of each byte (and the whole preamble as one block), so rendering a header
+# only concatenates cached chunks. That only holds for the table renderer with legacy
+# timing, where every bit has the same length and starts at phase zero; exact timing
+# (see pysame.formats) and the nco renderer render the whole burst.
+
+from collections import OrderedDict
+import numpy as np
+
+from .formats import get_format
+from .instrument import timed
+from .synthesis import render_bits
+
+PREAMBLE = bytes([0xAB] * 16)
+
+DEFAULT_MAX_BYTES = 8 * 1024 * 1024
+
+
+class GlyphCache:
+    # max_bytes bounds the memory held by cached waveforms; least recently used entries go first.
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes_held = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _get(self, key, build):
+        chunk = self._entries.get(key)
+        if chunk is not None:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return chunk
+
+        self.misses += 1
+        chunk = build()
+        chunk.setflags(write=False)
+        self._entries[key] = chunk
+        self.bytes_held += chunk.nbytes
+        while self.bytes_held > self.max_bytes and len(self._entries) > 1:
+            _, old = self._entries.popitem(last=False)
+            self.bytes_held -= old.nbytes
+            self.evictions += 1
+        return chunk
+
+    # Waveform of a single byte value (8 bits, least significant first).
+    def glyph(self, value, sample_rate, dtype=np.float64):
+        key = (sample_rate, get_format(dtype).name, value)
+        return self._get(key, lambda: render_bits(_byte_bits(bytes([value])), sample_rate, dtype))
+
+    # Waveform of the whole 16-byte preamble as one block.
+    def preamble(self, sample_rate, dtype=np.float64):
+        key = (sample_rate, get_format(dtype).name, 'preamble')
+        return self._get(key, lambda: render_bits(_byte_bits(PREAMBLE), sample_rate, dtype))
+
+    # Renders the preamble plus text (str or bytes); same output as binary_to_signal(create_header(...)[0]).
+    def render(self, text, sample_rate, dtype=np.float64):
+        if isinstance(text, str):
+            text = header_bytes(text)
+        chunks = [self.preamble(sample_rate, dtype)]
+        chunks.extend(self.glyph(c, sample_rate, dtype) for c in text)
+        return np.concatenate(chunks)
+
+    def clear(self):
+        self._entries.clear()
+        self.bytes_held = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+            'bytes_held': self.bytes_held,
+            'max_bytes': self.max_bytes
+        }
+
+
+# The bytes create_header puts on the air for text: one per character, its code point
+# (Latin-1 characters as themselves, anything above 255 wrapped to its low byte).
+def header_bytes(text):
+    return np.array([ord(c) for c in text], dtype=np.int64).astype('B').tobytes()
+
+
+def _byte_bits(data):
+    return np.unpackbits(np.frombuffer(data, dtype='B'), bitorder='little')
+
+
+default_cache = GlyphCache()
+
+
+# Renders a header string through the shared process-wide cache, or directly with exact
+# timing or the nco renderer.
+@timed()
+def render_header(text, sample_rate, dtype=np.float64, timing='legacy', renderer='table'):
+    if timing == 'legacy' and renderer == 'table':
+        return default_cache.render(text, sample_rate, dtype)
+    if isinstance(text, str):
+        text = header_bytes(text)
+    return render_bits(_byte_bits(PREAMBLE + text), sample_rate, dtype, timing, renderer)
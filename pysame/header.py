@@ -0,0 +1,64 @@
+# ###    PySame header encoder    ###
+#
+# Builds the SAME header bit stream and turns it into audio. Importing this module
+# only needs NumPy; none of the reference catalogs are loaded.
+
+import numpy as np
+
+from .instrument import timed
+from .synthesis import render_bits
+from .wavstream import RawWriter, WavWriter
+
+preamble = np.full(16, 0xAB, dtype='B')
+
+
+# returns a SAME digital header as binary data and its text representation.
+@timed()
+def create_header(lst):
+    s = "ZCZC-"
+    for i in range(len(lst)):
+        s += lst[i]
+        if i == 2:
+            s += '+'
+        else:
+            s += '-'
+
+    content = np.asarray([ord(c) for c in s])
+    data = np.empty(len(preamble) + len(content), dtype=np.dtype('B'))
+    data[:len(preamble)] = preamble
+    data[len(preamble):] = content
+    return np.unpackbits(data, bitorder='little'), s
+
+
+# Encodes a digital PCM audio signal based on binary data using FSK, with each bit lasting 1.92 ms.
+# dtype selects the sample type (e.g. np.int16, np.float32 or 'ulaw') directly, without a float64 intermediate.
+# timing='exact' keeps the exact baud rate at sample rates where a bit is not a whole number of samples,
+# and renderer='nco' renders it with continuous phase across bits.
+@timed()
+def binary_to_signal(binary_data, sample_rate, dtype=np.float64, timing='legacy', renderer='table'):
+    return render_bits(binary_data, sample_rate, dtype, timing, renderer)
+
+
+# Writes signal as a WAV audio file (16-bit by default; dtype may also be np.float32 or 'ulaw'),
+# or as headerless samples with raw. audio may be an array or an iterable of chunks
+# (e.g. from message_blocks); float samples are converted one block at a time.
+@timed()
+def write_audio_file(filename, samplerate, audio, dtype=np.int16, raw=False):
+    with (RawWriter(filename, dtype) if raw else WavWriter(filename, samplerate, dtype)) as w:
+        if isinstance(audio, np.ndarray):
+            w.write(audio)
+        else:
+            w.write_blocks(audio)
+
+
+# Splits a ZCZC header string back into the six fields joined by create_header.
+# Returns None if the string is not a well-formed header.
+def parse_header(s):
+    if not s.startswith('ZCZC-') or not s.endswith('-') or s.count('+') != 1:
+        return None
+    left, right = s[5:].split('+')
+    left = left.split('-', 2)
+    right = right[:-1].split('-', 2)
+    if len(left) != 3 or len(right) != 3:
+        return None
+    return left + right
@@ -0,0 +1,240 @@
+# ###    PySame instrumentation    ###
+#
+# Opt-in timing of the pipeline stages: catalog load, check_1 .. check_6,
+# create_header, binary_to_signal, render_header and write_audio_file. Each stage
+# keeps a call counter, an error counter and a latency histogram. While turned
+# off (the default) an instrumented function costs one global lookup on top of
+# the call. Turn it on with enable() or the PYSAME_INSTRUMENT=1 environment
+# variable, and export with to_json() or to_prometheus().
+#
+# add_arguments / run_instrumented give a command line tool the --stats, --profile
+# (cProfile) and --tracemalloc flags.
+
+from bisect import bisect_left
+import contextlib
+import functools
+import json
+import os
+import sys
+import time
+
+ENV = 'PYSAME_INSTRUMENT'
+
+# Histogram bucket upper bounds in seconds; a last, implicit bucket holds everything slower.
+BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3,
+           0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_enabled = os.environ.get(ENV, '') not in ('', '0')
+_stages = {}
+_null = contextlib.nullcontext()
+
+
+class Stage:
+    __slots__ = ('count', 'errors', 'total', 'min', 'max', 'bounds', 'buckets')
+
+    # bounds are the bucket upper bounds (default BUCKETS, for latencies); stages that are merged must share them.
+    def __init__(self, bounds=BUCKETS):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.bounds = bounds
+        self.buckets = [0] * (len(bounds) + 1)
+
+    def observe(self, seconds, failed=False):
+        self.count += 1
+        self.errors += failed
+        self.total += seconds
+        if self.min is None or seconds < self.min:
+            self.min = seconds
+        if self.max is None or seconds > self.max:
+            self.max = seconds
+        self.buckets[bisect_left(self.bounds, seconds)] += 1
+
+    def merge(self, other):
+        self.count += other.count
+        self.errors += other.errors
+        self.total += other.total
+        for value in (other.min, other.max):
+            if value is not None:
+                self.min = value if self.min is None else min(self.min, value)
+                self.max = value if self.max is None else max(self.max, value)
+        self.buckets = [a + b for a, b in zip(self.buckets, other.buckets)]
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'total_seconds': self.total,
+            'mean_seconds': self.total / self.count if self.count else None,
+            'min_seconds': self.min,
+            'max_seconds': self.max,
+            'buckets': [[le, n] for le, n in zip(list(self.bounds) + ['+Inf'], self.buckets)]
+        }
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    _stages.clear()
+
+
+# Adds one observation of seconds to the named stage.
+def record(name, seconds, failed=False):
+    stage = _stages.get(name)
+    if stage is None:
+        stage = _stages[name] = Stage()
+    stage.observe(seconds, failed)
+
+
+# Decorator timing every call of a function as the stage name (default: the function's name).
+def timed(name=None):
+    def decorate(fn):
+        stage_name = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            t = time.perf_counter()
+            failed = True
+            try:
+                result = fn(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                record(stage_name, time.perf_counter() - t, failed)
+        return wrapper
+    return decorate
+
+
+class _Timer:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        record(self.name, time.perf_counter() - self.start, exc_type is not None)
+
+
+# Context manager timing a block as the stage name; a shared no-op while instrumentation is off.
+def stage(name):
+    return _Timer(name) if _enabled else _null
+
+
+# Current statistics of every stage, as plain dicts.
+def snapshot():
+    return {name: stage.as_dict() for name, stage in sorted(_stages.items())}
+
+
+# Returns the raw statistics and clears them, e.g. to send them from a worker process to merge().
+def drain():
+    stages = dict(_stages)
+    _stages.clear()
+    return stages
+
+
+# Adds statistics returned by drain() in another process.
+def merge(stages):
+    for name, other in stages.items():
+        stage = _stages.get(name)
+        if stage is None:
+            stage = _stages[name] = Stage()
+        stage.merge(other)
+
+
+def to_json(indent=2):
+    return json.dumps({'stages': snapshot()}, indent=indent)
+
+
+# Prometheus text exposition format: one histogram plus an error counter per stage.
+def to_prometheus(prefix='pysame'):
+    lines = ['# HELP {}_stage_seconds Time spent in pySame pipeline stages.'.format(prefix),
+             '# TYPE {}_stage_seconds histogram'.format(prefix)]
+    for name, stage in sorted(_stages.items()):
+        cumulative = 0
+        for le, n in zip(list(stage.bounds) + ['+Inf'], stage.buckets):
+            cumulative += n
+            lines.append('{}_stage_seconds_bucket{{stage="{}",le="{}"}} {}'.format(prefix, name, le, cumulative))
+        lines.append('{}_stage_seconds_sum{{stage="{}"}} {!r}'.format(prefix, name, stage.total))
+        lines.append('{}_stage_seconds_count{{stage="{}"}} {}'.format(prefix, name, stage.count))
+    lines.append('# HELP {}_stage_errors_total Calls of a stage that raised an exception.'.format(prefix))
+    lines.append('# TYPE {}_stage_errors_total counter'.format(prefix))
+    for name, stage in sorted(_stages.items()):
+        lines.append('{}_stage_errors_total{{stage="{}"}} {}'.format(prefix, name, stage.errors))
+    return '\n'.join(lines) + '\n'
+
+
+# Writes the statistics to path (- for stdout): Prometheus text for a .prom or .txt file, JSON otherwise.
+def save(path):
+    text = to_prometheus() if path.endswith(('.prom', '.txt')) else to_json() + '\n'
+    if path == '-':
+        sys.stdout.write(text)
+    else:
+        with open(path, 'w') as f:
+            f.write(text)
+
+
+def add_arguments(parser):
+    group = parser.add_argument_group('instrumentation')
+    group.add_argument('--stats', metavar='FILE', default=None,
+                       help='record stage timings and save them (.prom for Prometheus text, JSON otherwise, - for stdout)')
+    group.add_argument('--profile', metavar='FILE', default=None,
+                       help='run under cProfile, save the profile and print the top functions to stderr')
+    group.add_argument('--tracemalloc', metavar='N', type=int, default=0,
+                       help='trace memory allocations and print the top N allocation sites to stderr')
+
+
+# Calls fn(*args) with the instrumentation requested by the add_arguments flags and returns its result.
+def run_instrumented(args, fn, *fn_args):
+    profiler = None
+    if args.stats:
+        enable()
+    if args.tracemalloc:
+        import tracemalloc
+        tracemalloc.start()
+    if args.profile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        return fn(*fn_args)
+    finally:
+        if profiler is not None:
+            import pstats
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+            pstats.Stats(profiler, stream=sys.stderr).sort_stats('cumulative').print_stats(20)
+        if args.tracemalloc:
+            _print_allocations(args.tracemalloc)
+        if args.stats:
+            save(args.stats)
+
+
+def _print_allocations(limit):
+    import tracemalloc
+
+    snapshot = tracemalloc.take_snapshot()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print('Traced memory: {:.1f} KiB current, {:.1f} KiB peak'.format(current / 1024, peak / 1024), file=sys.stderr)
+    for stat in snapshot.statistics('lineno')[:limit]:
+        print(stat, file=sys.stderr)
@@ -0,0 +1,145 @@
+# ###    PySame bulk locations    ###
+#
+# Resolves long location lists (e.g. the hundreds of counties of an upstream feed)
+# in one call against the catalog's FIPS index, instead of feeding '.'-separated
+# strings to check_3 31 entries at a time. The result is deduplicated, every state
+# whose counties are all listed is collapsed into its state-wide 0SS000 code, and
+# the codes are split into the fewest groups that respect the 31-code limit of a
+# SAME header, keeping each state's codes together where that costs no extra header.
+# Every group is a location field ready for create_header.
+
+from collections import namedtuple
+import math
+
+from .catalog import get_catalog
+from .fipsindex import NATIONWIDE
+from .search import SUGGEST_SCORE, suggestion
+
+MAX_CODES = 31
+
+# groups: location fields ('036001-036005-...'), one per header
+# codes: every resolved PSSCCC code, deduplicated and collapsed, in output order
+# collapsed: state ids replaced by their state-wide code
+# duplicates: number of repeated entries dropped
+# unresolved: (entry, reason) for every entry that could not be resolved
+LocationPlan = namedtuple('LocationPlan', 'groups codes collapsed duplicates unresolved')
+
+
+# Resolves one entry to a PSSCCC code. An entry is a 6-digit PSSCCC or 5-digit SSCCC code,
+# a state name or USPS abbreviation, 'County, State' or a (county, state) pair.
+# Returns (code, None) or (None, reason).
+def resolve_location(entry, catalog=None):
+    catalog = catalog or get_catalog()
+    index = catalog.fips_index
+
+    if isinstance(entry, (tuple, list)):
+        parts = [str(x).strip() for x in entry]
+    else:
+        entry = str(entry).strip()
+        if entry.isdigit() and len(entry) in (5, 6):
+            code = entry.zfill(6)
+            if index.lookup(code) is None:
+                return None, 'Unknown location code {}'.format(entry)
+            return code, None
+        parts = [x.strip() for x in entry.split(',')]
+    if len(parts) > 2 or '' in parts:
+        return None, 'Doesn\'t understand {}'.format(entry)
+
+    state = parts[-1]
+    found = index.state_by_abv(state) if len(state) == 2 else index.state_by_name(state)
+    if found is None:
+        match = None if len(state) == 2 else catalog.search_index('states').best(state, SUGGEST_SCORE)
+        return None, '{} is not a state{}'.format(state, suggestion(match))
+    state_id, state_name = found
+    if len(parts) == 1:
+        return '0{}000'.format(state_id), None
+
+    county_id = index.county(parts[0], state_id)
+    if county_id is None:
+        match = catalog.search_index('counties').best(parts[0], SUGGEST_SCORE, group=state_id)
+        return None, 'County {} not found in {}{}'.format(parts[0], state_name, suggestion(match))
+    return '0{}{}'.format(state_id, county_id), None
+
+
+# Resolves a whole list of locations (an iterable of entries, or one string separated by
+# '.' or newlines as typed for check_3) and plans the headers needed to cover it.
+# collapse=False keeps complete states as individual counties.
+def resolve_locations(entries, collapse=True, max_codes=MAX_CODES, catalog=None):
+    catalog = catalog or get_catalog()
+    if isinstance(entries, str):
+        entries = [x for x in entries.replace('\n', '.').split('.') if x.strip() != '']
+
+    codes = []
+    seen = set()
+    duplicates = 0
+    unresolved = []
+    for entry in entries:
+        code, reason = resolve_location(entry, catalog)
+        if code is None:
+            unresolved.append((entry, reason))
+        elif code in seen:
+            duplicates += 1
+        else:
+            seen.add(code)
+            codes.append(code)
+
+    if NATIONWIDE in seen:
+        return LocationPlan([NATIONWIDE], [NATIONWIDE], [], duplicates, unresolved)
+
+    by_state = {}
+    for code in codes:
+        by_state.setdefault(code[1:3], []).append(code)
+
+    collapsed = []
+    for state_id, state_codes in by_state.items():
+        statewide = '0{}000'.format(state_id)
+        if statewide in seen:
+            # a state-wide code already covers every county and county part of the state
+            by_state[state_id] = [statewide]
+            if len(state_codes) > 1:
+                collapsed.append(state_id)
+        elif collapse:
+            listed = {code[3:] for code in state_codes if code[0] == '0'}
+            all_counties = catalog.fips_index.county_ids.get(state_id)
+            if all_counties and listed >= all_counties:
+                by_state[state_id] = [statewide]
+                collapsed.append(state_id)
+
+    groups = pack_groups(list(by_state.values()), max_codes)
+    return LocationPlan(['-'.join(group) for group in groups], [c for group in groups for c in group],
+                        collapsed, duplicates, unresolved)
+
+
+# Splits blocks of codes (one block per state) into the fewest groups of at most max_codes.
+# Blocks are kept whole where possible (first fit, largest first); if that would need more
+# groups than the minimum, the codes are simply cut in order.
+def pack_groups(blocks, max_codes=MAX_CODES):
+    total = sum(len(block) for block in blocks)
+    if total == 0:
+        return []
+    minimum = math.ceil(total / max_codes)
+
+    pieces = []
+    for block in blocks:
+        for i in range(0, len(block), max_codes):
+            pieces.append(block[i:i + max_codes])
+    pieces.sort(key=len, reverse=True)
+
+    groups = []
+    for piece in pieces:
+        for group in groups:
+            if len(group) + len(piece) <= max_codes:
+                group.extend(piece)
+                break
+        else:
+            groups.append(list(piece))
+
+    if len(groups) > minimum:
+        flat = [code for block in blocks for code in block]
+        groups = [flat[i:i + max_codes] for i in range(0, total, max_codes)]
+    return [sorted(group) for group in groups]
+
+
+# The six-field lists for create_header, one per group of the plan.
+def header_fields(plan, originator, event, purge, issue, callsign):
+    return [[originator, event, group, purge, issue, callsign] for group in plan.groups]
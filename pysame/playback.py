@@ -0,0 +1,191 @@
+# ###    PySame playback    ###
+#
+# Streams a message in real time to stdout, a named pipe or a socket, for feeding
+# a broadcast chain directly instead of writing a WAV file first. A producer thread
+# pulls blocks from the synthesis path (message_blocks) into a bounded queue while
+# the caller's thread writes them to the sink paced to the sample clock, staying at
+# most `lead` seconds ahead of real time. The first block goes out as soon as it is
+# rendered, so the first sample leaves within milliseconds of validation. If the
+# producer falls behind and the sink runs dry, the gap is counted as an underrun
+# and the clock is re-anchored.
+#
+# usage: pysame-play WXR TOR "Albany, NY" 0100 0 KOKX/NWS [--to - | fifo-path | tcp:host:port | unix:path]
+#                    [-r rate] [-s pcm16|float32|ulaw] [--wav] [--attention seconds] [--lead seconds]
+
+import json
+import math
+import queue
+import socket
+import sys
+import threading
+import time
+
+from .assembler import BLOCK_SIZE, message_blocks
+from .formats import get_format
+from .synthesis import convert_samples
+from .wavstream import RawWriter, WavWriter
+
+DEFAULT_LEAD = 0.1
+DEFAULT_BUFFER = 1.0
+# lateness below this is scheduling jitter, not an underrun
+UNDERRUN_SLACK = 0.002
+
+
+# Opens a sink for writing: '-' is stdout, 'tcp:host:port' and 'unix:path' connect a socket,
+# anything else is opened as a file (e.g. a named pipe created with os.mkfifo). Returns a binary file object.
+def open_sink(spec):
+    if spec == '-':
+        return sys.stdout.buffer
+    if spec.startswith('tcp:'):
+        host, sep, port = spec[4:].rpartition(':')
+        return socket.create_connection((host or '127.0.0.1', int(port))).makefile('wb')
+    if spec.startswith('unix:'):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(spec[5:])
+        return sock.makefile('wb')
+    return open(spec, 'wb')
+
+
+class Player:
+    # sink is a binary file object; fmt the sample format written to it (headerless unless wav).
+    # lead is how far (in seconds) output may run ahead of real time, buffer how much audio
+    # the producer may queue. clock and sleep can be replaced, e.g. by a simulated clock in tests.
+    def __init__(self, sink, sample_rate, fmt='pcm16', wav=False, lead=DEFAULT_LEAD, buffer=DEFAULT_BUFFER,
+                 block_size=BLOCK_SIZE, clock=time.monotonic, sleep=time.sleep):
+        self.sink = sink
+        self.sample_rate = sample_rate
+        self.format = get_format(fmt)
+        self.wav = wav
+        self.lead = lead
+        self.block_size = block_size
+        self.max_blocks = max(2, math.ceil(buffer * sample_rate / block_size))
+        self.clock = clock
+        self.sleep = sleep
+        self.stats = {}
+
+    # Renders and plays a whole message (see message_blocks for the options). Returns the stats.
+    def play_message(self, header, attention=8.0, audio=None, **options):
+        started = self.clock()
+        blocks = message_blocks(header, self.sample_rate, self.format, self.block_size, attention, audio, **options)
+        return self.play(blocks, started)
+
+    # Plays an iterable of sample blocks in real time. started is when the request arrived
+    # (default: now) and is used to measure the latency of the first sample. Returns the stats.
+    def play(self, blocks, started=None):
+        started = self.clock() if started is None else started
+        stats = self.stats = {'samples': 0, 'blocks': 0, 'underruns': 0, 'underrun_seconds': 0.0,
+                              'first_sample_latency': None, 'buffer_peak': 0, 'buffer_blocks': self.max_blocks}
+        pending = queue.Queue(self.max_blocks)
+        stop = threading.Event()
+        producer = threading.Thread(target=self._produce, args=(blocks, pending, stop), daemon=True)
+        producer.start()
+
+        if self.wav:
+            writer = WavWriter(self.sink, self.sample_rate, self.format)
+        else:
+            writer = RawWriter(self.sink, self.format)
+        anchor = None
+        try:
+            while True:
+                stats['buffer_peak'] = max(stats['buffer_peak'], pending.qsize())
+                item = pending.get()
+                if item is None:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+
+                now = self.clock()
+                if anchor is None:
+                    anchor = now
+                else:
+                    dry = anchor + stats['samples'] / self.sample_rate
+                    if now - dry > UNDERRUN_SLACK:
+                        stats['underruns'] += 1
+                        stats['underrun_seconds'] += now - dry
+                        anchor += now - dry
+                    ahead = dry - now - self.lead
+                    if ahead > 0:
+                        self.sleep(ahead)
+
+                writer.write(item)
+                _flush(self.sink)
+                if stats['first_sample_latency'] is None:
+                    stats['first_sample_latency'] = self.clock() - started
+                stats['samples'] += len(item)
+                stats['blocks'] += 1
+        finally:
+            stop.set()
+            if self.wav:
+                writer.close()
+            _flush(self.sink)
+            producer.join(1.0)
+        stats['seconds'] = stats['samples'] / self.sample_rate
+        stats['elapsed'] = self.clock() - started
+        return stats
+
+    def _produce(self, blocks, pending, stop):
+        try:
+            for block in blocks:
+                if block.dtype != self.format.dtype:
+                    block = convert_samples(block, self.format)
+                while not stop.is_set():
+                    try:
+                        pending.put(block, timeout=0.1)
+                        break
+                    except queue.Full:
+                        pass
+                if stop.is_set():
+                    return
+            pending.put(None)
+        except BaseException as e:
+            pending.put(e)
+
+
+def _flush(sink):
+    try:
+        sink.flush()
+    except (AttributeError, ValueError, OSError):
+        pass
+
+
+def main(argv=None):
+    import argparse
+
+    from .batch import validate_job
+    from .header import create_header
+    from .validate import FIELDS
+
+    parser = argparse.ArgumentParser(description='Stream a SAME message in real time.')
+    parser.add_argument('fields', nargs=6, metavar='FIELD', help='originator event location purge issue callsign')
+    parser.add_argument('--to', default='-', help='sink: - (stdout), a file or named pipe, tcp:host:port or unix:path')
+    parser.add_argument('-r', '--rate', type=int, default=44100, help='sample rate')
+    parser.add_argument('-s', '--sample-format', choices=('pcm16', 'float32', 'ulaw'), default='pcm16')
+    parser.add_argument('--wav', action='store_true', help='send a streaming WAV header first')
+    parser.add_argument('--attention', type=float, default=8.0, help='attention tone length in seconds (0 for none)')
+    parser.add_argument('--lead', type=float, default=DEFAULT_LEAD, help='how far output may run ahead of real time')
+    args = parser.parse_args(argv)
+
+    started = time.monotonic()
+    values, warnings, errors = validate_job(dict(zip(FIELDS, args.fields)))
+    for message in errors + warnings:
+        print(message, file=sys.stderr)
+    if errors:
+        return 1
+    header = create_header(values)[1]
+    print(header, file=sys.stderr)
+
+    sink = open_sink(args.to)
+    player = Player(sink, args.rate, args.sample_format, args.wav, args.lead)
+    try:
+        stats = player.play(message_blocks(header, args.rate, args.sample_format, attention=args.attention), started)
+    except BrokenPipeError:
+        return 1
+    finally:
+        if sink is not sys.stdout.buffer:
+            sink.close()
+    print(json.dumps(stats), file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,39 @@
+# ###    PySame render pools    ###
+#
+# Process pools shared by batch mode and compilations. Workers are forked where
+# the platform allows it, so they share the parent's catalogs copy-on-write; the
+# tone tables are handed to them explicitly for platforms that spawn instead.
+# Each worker keeps the settings its pool was started with, which the pool's
+# task function reads back with worker_settings().
+
+import multiprocessing
+
+from . import instrument
+from .synthesis import export_tone_tables, install_tone_tables
+
+_settings = None
+
+
+# Starts a pool of workers processes. settings is handed to every worker as is; with instrumented,
+# the workers record stage timings from a clean slate.
+def render_pool(workers, settings, instrumented=False):
+    if 'fork' in multiprocessing.get_all_start_methods():
+        ctx = multiprocessing.get_context('fork')
+    else:
+        ctx = multiprocessing.get_context()
+    return ctx.Pool(workers, initializer=_init_worker, initargs=(export_tone_tables(), settings, instrumented))
+
+
+# The settings the current worker's pool was started with.
+def worker_settings():
+    return _settings
+
+
+def _init_worker(tables, settings, instrumented):
+    global _settings
+    install_tone_tables(tables)
+    _settings = settings
+    if instrumented:
+        # forked workers start with a copy of the parent's statistics
+        instrument.reset()
+        instrument.enable()
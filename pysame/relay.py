@@ -0,0 +1,224 @@
+# ###    PySame relay    ###
+#
+# Relays upstream alerts the way an EAS participant has to: received headers (as
+# text, or decoded from monitored audio) are deduplicated and re-originated with
+# our own callsign in the last field. Every alert arrives at least three times
+# (one per burst) and usually from several monitored sources, so headers are keyed
+# on everything but the callsign and remembered in a bounded index that forgets
+# them after ttl seconds. A new alert is re-rendered through a HeaderTemplate, which
+# reuses the audio of every character that did not change since the previous
+# relay (the preamble and "ZCZC-" always, often the originator and event too).
+# The latency from receiving a header to having the relayed burst ready is
+# recorded per alert. For audio it runs from the moment the header's last bit
+# arrived, so it includes the audio buffered behind it in the chunk, decoding
+# and rendering.
+#
+# usage: pysame-relay --callsign "WXYZ/FM " [-o outdir] [-r rate] [--attention seconds] input...
+#        where an input is a WAV file to decode or - to read header strings from stdin, one per line
+
+from collections import OrderedDict, namedtuple
+import json
+import sys
+import time
+import numpy as np
+
+from .assembler import message_blocks
+from .decoder import Decoder
+from .formats import get_format
+from .header import parse_header
+from .instrument import Stage
+from .template import HeaderTemplate
+from .validate import check_6
+
+DEFAULT_TTL = 15 * 60
+DEFAULT_MAX_ENTRIES = 1024
+
+# text: the relayed header, fields: its six fields, source: where it was received first,
+# received: clock time it arrived, signal: the rendered header burst, latency: seconds from
+# received until the burst was rendered.
+RelayedAlert = namedtuple('RelayedAlert', 'text fields source received signal latency')
+
+
+# The deduplication key of a header: its fields without the callsign of whoever sent it.
+def relay_key(fields):
+    return tuple(fields[:5])
+
+
+class SeenIndex:
+    # Remembers keys for ttl seconds, at most max_entries of them (oldest forgotten first).
+    def __init__(self, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    # Forgets every key older than ttl at time now. Keys are kept in arrival order, so the oldest are in front.
+    def expire(self, now):
+        while self._entries:
+            key, seen = next(iter(self._entries.items()))
+            if now - seen < self.ttl:
+                break
+            del self._entries[key]
+
+    # Records key as seen at now. Returns True if it is new, False for a duplicate.
+    def add(self, key, now):
+        self.expire(now)
+        if key in self._entries:
+            return False
+        self._entries[key] = now
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return True
+
+
+class Relay:
+    # callsign is ours (validated with check_6); relayed bursts are rendered at sample_rate in dtype
+    # (a NumPy dtype or format name). clock can be replaced, e.g. by a simulated clock in tests.
+    def __init__(self, callsign, sample_rate=44100, dtype=np.int16, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES,
+                 clock=time.monotonic, cache=None):
+        value, code, message = check_6(callsign)
+        if code == 2:
+            raise ValueError(message)
+        self.callsign = value
+        self.sample_rate = sample_rate
+        self.format = get_format(dtype)
+        self.clock = clock
+        self.cache = cache
+        self.seen = SeenIndex(ttl, max_entries)
+        self.latency = Stage()
+        self.counts = {'received': 0, 'relayed': 0, 'duplicates': 0, 'invalid': 0, 'eoms': 0}
+        self._template = None
+        self._decoders = {}
+
+    # Handles one received header string. Returns a RelayedAlert, or None for a duplicate or
+    # a string that is not a header. received is when it arrived (default: now).
+    def feed_header(self, text, source=None, received=None):
+        received = self.clock() if received is None else received
+        self.counts['received'] += 1
+        fields = parse_header(text.strip())
+        if fields is None:
+            self.counts['invalid'] += 1
+            return None
+        if not self.seen.add(relay_key(fields), received):
+            self.counts['duplicates'] += 1
+            return None
+
+        fields = fields[:5] + [self.callsign]
+        if self._template is None:
+            self._template = HeaderTemplate(fields, self.sample_rate, self.format, self.cache)
+        else:
+            self._template.update(fields)
+        signal = self._template.signal.copy()
+
+        latency = self.clock() - received
+        self.latency.observe(latency)
+        self.counts['relayed'] += 1
+        return RelayedAlert(self._template.text, fields, source, received, signal, latency)
+
+    # Decodes a chunk of monitored audio from source (one decoder per source, created at
+    # sample_rate, default the relay's rate) and returns the RelayedAlerts it completed.
+    # received is when the last sample of the chunk arrived (default: now, for live audio);
+    # a header that ended earlier in the chunk is taken to have arrived that much earlier.
+    def feed_audio(self, chunk, source=None, sample_rate=None, received=None):
+        received = self.clock() if received is None else received
+        decoder = self._decoders.get(source)
+        if decoder is None:
+            decoder = self._decoders[source] = Decoder(sample_rate or self.sample_rate)
+        end = decoder.samples + len(chunk)
+        return self._handle(decoder, decoder.feed(chunk), source, received, end)
+
+    # Completes a burst that ends exactly at the end of source's audio; call when a source stops.
+    def flush(self, source=None, received=None):
+        received = self.clock() if received is None else received
+        decoder = self._decoders.pop(source, None)
+        if decoder is None:
+            return []
+        end = decoder.samples
+        return self._handle(decoder, decoder.flush(), source, received, end)
+
+    # end is the sample position that arrived at clock time received.
+    def _handle(self, decoder, messages, source, received, end):
+        alerts = []
+        for message in messages:
+            if message.fields is None:
+                self.counts['eoms'] += 1
+                continue
+            behind = max(end - message.end - 1, 0) / decoder.sample_rate
+            alert = self.feed_header(message.text, source, received - behind)
+            if alert is not None:
+                alerts.append(alert)
+        return alerts
+
+    # The complete relayed activation of alert as blocks (see message_blocks for the options).
+    def message(self, alert, attention=8.0, audio=None, **options):
+        return message_blocks(alert.text, self.sample_rate, self.format, attention=attention, audio=audio,
+                              burst=alert.signal, **options)
+
+    def stats(self):
+        stats = dict(self.counts)
+        stats['remembered'] = len(self.seen)
+        stats['evictions'] = self.seen.evictions
+        stats['latency'] = self.latency.as_dict()
+        if self._template is not None:
+            stats['rendered_chars'] = self._template.rendered_chars
+            stats['patched_chars'] = self._template.patched_chars
+        return stats
+
+
+def main(argv=None):
+    import argparse
+    import os
+
+    from .header import write_audio_file
+    from .wavstream import read_blocks
+
+    parser = argparse.ArgumentParser(description='Relay SAME alerts with our own callsign.')
+    parser.add_argument('inputs', nargs='+', metavar='INPUT', help='WAV file to decode, or - for header strings on stdin')
+    parser.add_argument('--callsign', required=True, help='our station callsign (8 characters)')
+    parser.add_argument('-o', '--outdir', default=None, help='write each relayed message as a WAV file here')
+    parser.add_argument('-r', '--rate', type=int, default=44100, help='sample rate of the relayed audio')
+    parser.add_argument('--attention', type=float, default=8.0, help='attention tone length in seconds (0 for none)')
+    parser.add_argument('--ttl', type=float, default=DEFAULT_TTL, help='seconds a relayed alert is remembered')
+    args = parser.parse_args(argv)
+
+    try:
+        relay = Relay(args.callsign, args.rate, ttl=args.ttl)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    if args.outdir:
+        os.makedirs(args.outdir, exist_ok=True)
+
+    def relayed(alerts):
+        for alert in alerts:
+            print('{} ({}, {:.2f} ms)'.format(alert.text, alert.source, alert.latency * 1000))
+            if args.outdir:
+                path = os.path.join(args.outdir, 'relay-{:04d}.wav'.format(relay.counts['relayed']))
+                write_audio_file(path, args.rate, relay.message(alert, args.attention))
+
+    for source in args.inputs:
+        if source == '-':
+            for line in sys.stdin:
+                alert = relay.feed_header(line, 'stdin') if line.strip() else None
+                if alert is not None:
+                    relayed([alert])
+            continue
+        # files are fed in blocks of about 0.1 s, as a live monitor would deliver them
+        sample_rate, blocks = read_blocks(source, 4096)
+        for block in blocks:
+            relayed(relay.feed_audio(block, source, sample_rate))
+        relayed(relay.flush(source))
+
+    print(json.dumps(relay.stats()), file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
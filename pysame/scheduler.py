@@ -0,0 +1,282 @@
+# ###    PySame broadcast scheduler    ###
+#
+# Queues alerts and scheduled tests for air and decides what goes out when. Among
+# the items whose slot has come, the one with the most urgent event level goes
+# first (the lvl attribute of events.xml: 1 for warnings and emergencies down to
+# 4 for tests), then the earliest slot. An item that becomes due while a less
+# urgent one is on air preempts it as soon as its audio is rendered; the preempted
+# message goes back in the queue and airs again from the start once the channel is
+# free.
+#
+# Each message's audio is rendered on a background thread render_ahead seconds
+# before its slot (immediately for items that are due now), so going on air only
+# hands over finished samples. The scheduler is driven by tick(), which run()
+# calls in a loop; clock and sleep can be replaced by a SimulatedClock to step
+# through a schedule without waiting. metrics() reports the queue depth, how long
+# before air time each render finished (render lead), how late the renders that
+# finished after their slot were (render late) and missed deadlines.
+
+from bisect import insort
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import heapq
+import itertools
+import time
+import numpy as np
+
+from .assembler import message_segments
+from .catalog import get_catalog
+from .formats import get_format
+from .header import parse_header
+from .instrument import Stage
+
+DEFAULT_RENDER_AHEAD = 30.0
+# an item going on air later than this after its slot counts as a missed deadline
+LATE_TOLERANCE = 0.5
+# level of event codes missing from the catalog: after everything else
+UNKNOWN_LEVEL = 5
+# render lead histogram bucket upper bounds in seconds, around the default render_ahead
+LEAD_BUCKETS = (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 15.0, 20.0, 25.0, 30.0, 45.0, 60.0, 120.0, 300.0)
+
+QUEUED, ON_AIR, AIRED, FAILED = 'queued', 'on air', 'aired', 'failed'
+
+
+# Priority of an event code from its lvl in events.xml; lower is more urgent.
+def event_level(code, catalog=None):
+    event = (catalog or get_catalog()).events.get(code)
+    return int(event[2]) if event is not None else UNKNOWN_LEVEL
+
+
+class SimulatedClock:
+    # A clock for tests: time only moves when sleep() (or advance()) is called.
+    def __init__(self, start=0.0):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += max(seconds, 0.0)
+
+    advance = sleep
+
+
+class Item:
+    # at: when the item should go on air (clock time); options are passed to message_segments.
+    def __init__(self, seq, header, fields, level, at, options):
+        self.seq = seq
+        self.header = header
+        self.fields = fields
+        self.event = fields[1]
+        self.level = level
+        self.at = at
+        self.options = options
+        self.state = QUEUED
+        self.audio = None
+        self.future = None
+        self.error = None
+        self.rendered_at = None
+        self.started = None
+        self.ended = None
+        self.preemptions = 0
+        self.waited = False
+
+    # Length of the rendered message in seconds (None until it is rendered).
+    def duration(self, sample_rate):
+        return None if self.audio is None else len(self.audio) / sample_rate
+
+    def __repr__(self):
+        return '<Item {} {} lvl {} at {:.1f} {}>'.format(self.seq, self.event, self.level, self.at, self.state)
+
+
+class Scheduler:
+    # Messages are rendered at sample_rate in dtype (a NumPy dtype or format name). on_air(item) is
+    # called when an item goes on air (item.audio holds its samples) and on_preempt(item) when it is
+    # taken off air early. background=False renders inside tick() instead of on a worker thread,
+    # which makes runs on a SimulatedClock deterministic.
+    def __init__(self, sample_rate=44100, dtype=np.int16, render_ahead=DEFAULT_RENDER_AHEAD, clock=time.monotonic,
+                 sleep=time.sleep, on_air=None, on_preempt=None, background=True, catalog=None):
+        self.sample_rate = sample_rate
+        self.format = get_format(dtype)
+        self.render_ahead = render_ahead
+        self.clock = clock
+        self.sleep = sleep
+        self.on_air = on_air
+        self.on_preempt = on_preempt
+        self.catalog = catalog
+        self.airing = None
+        self.render_lead = Stage(LEAD_BUCKETS)
+        self.render_late = Stage()
+        self.counts = {'submitted': 0, 'aired': 0, 'preempted': 0, 'missed_deadlines': 0, 'render_waits': 0,
+                       'failed': 0}
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix='pysame-render') if background else None
+        self._upcoming = []
+        self._ready = []
+        self._seq = itertools.count()
+
+    # Queues a header (the text returned by create_header) to air at clock time at (default: now).
+    # options go to message_segments (attention, audio, gap, timing, renderer). Returns the Item.
+    def submit(self, header, at=None, **options):
+        fields = parse_header(header)
+        if fields is None:
+            raise ValueError('Not a SAME header: {}'.format(header))
+        at = self.clock() if at is None else at
+        item = Item(next(self._seq), header, fields, event_level(fields[1], self.catalog), at, options)
+        insort(self._upcoming, (item.at, item.seq, item))
+        self.counts['submitted'] += 1
+        return item
+
+    def queue_depth(self):
+        return len(self._upcoming) + len(self._ready)
+
+    # Advances the schedule to now (default: the clock). Returns the clock time of the next thing
+    # the scheduler is waiting for, or None when there is nothing left to do.
+    def tick(self, now=None):
+        now = self.clock() if now is None else now
+
+        if self.airing is not None and now >= self.airing.started + self.airing.duration(self.sample_rate):
+            self.airing.state = AIRED
+            self.airing.ended = self.airing.started + self.airing.duration(self.sample_rate)
+            self.counts['aired'] += 1
+            self.airing = None
+
+        while self._upcoming and self._upcoming[0][0] <= now:
+            at, seq, item = self._upcoming.pop(0)
+            heapq.heappush(self._ready, (item.level, at, seq, item))
+
+        for key in self._ready:
+            self._render(key[-1])
+        for at, seq, item in self._upcoming:
+            if at - self.render_ahead > now:
+                break
+            self._render(item)
+        self._drop_failed()
+
+        # the urgent item only takes over once its audio is ready; until then the current one stays on air
+        if self._preempting() and self._collect(self._ready[0][-1]):
+            item = self.airing
+            item.state = QUEUED
+            item.preemptions += 1
+            self.counts['preempted'] += 1
+            self.airing = None
+            heapq.heappush(self._ready, (item.level, item.at, item.seq, item))
+            if self.on_preempt is not None:
+                self.on_preempt(item)
+
+        if self.airing is None and self._ready:
+            item = self._ready[0][-1]
+            if self._collect(item):
+                heapq.heappop(self._ready)
+                self._start(item, now)
+            elif not item.waited:
+                item.waited = True
+                self.counts['render_waits'] += 1
+
+        return self._next_wakeup(now)
+
+    # Runs the schedule until clock time until (default: until nothing is left), sleeping in
+    # between ticks. While the next item to air is still rendering it waits for the render
+    # (at most poll seconds at a time) instead of sleeping on the clock.
+    def run(self, until=None, poll=0.05):
+        while True:
+            now = self.clock()
+            if until is not None and now >= until:
+                return
+            wakeup = self.tick(now)
+            if wakeup is None:
+                if until is None:
+                    return
+                wakeup = until
+            if until is not None:
+                wakeup = min(wakeup, until)
+            renders = self._pending_renders()
+            if renders and wakeup <= now:
+                wait(renders, poll, FIRST_COMPLETED)
+            else:
+                self.sleep(wakeup - now)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+    def metrics(self):
+        metrics = dict(self.counts)
+        metrics['queue_depth'] = self.queue_depth()
+        metrics['on_air'] = None if self.airing is None else self.airing.header
+        metrics['render_lead'] = self.render_lead.as_dict()
+        metrics['render_late'] = self.render_late.as_dict()
+        return metrics
+
+    def _render(self, item):
+        if item.future is not None or item.audio is not None or item.state == FAILED:
+            return
+        if self._executor is None:
+            try:
+                item.audio, item.rendered_at = self._render_audio(item)
+            except Exception as e:
+                item.error = e
+                item.state = FAILED
+        else:
+            item.future = self._executor.submit(self._render_audio, item)
+
+    def _render_audio(self, item):
+        segments = message_segments(item.header, self.sample_rate, self.format, **item.options)
+        return np.concatenate(list(segments)), self.clock()
+
+    # True once item's audio is available, picking up the result of a background render.
+    def _collect(self, item):
+        if item.audio is None and item.future is not None and item.future.done():
+            try:
+                item.audio, item.rendered_at = item.future.result()
+            except Exception as e:
+                item.error = e
+                item.state = FAILED
+        return item.audio is not None
+
+    # True when a ready item is more urgent than the one on air.
+    def _preempting(self):
+        return self.airing is not None and bool(self._ready) and self._ready[0][0] < self.airing.level
+
+    def _pending_renders(self):
+        items = [key[-1] for key in self._ready] + [key[-1] for key in self._upcoming]
+        return [item.future for item in items if item.future is not None and not item.future.done()]
+
+    def _drop_failed(self):
+        for key in self._ready:
+            self._collect(key[-1])
+        failed = [key for key in self._ready if key[-1].state == FAILED]
+        if failed:
+            self.counts['failed'] += len(failed)
+            self._ready = [key for key in self._ready if key[-1].state != FAILED]
+            heapq.heapify(self._ready)
+
+    def _start(self, item, now):
+        item.state = ON_AIR
+        item.started = now
+        self.airing = item
+        if item.preemptions == 0:
+            lead = item.at - item.rendered_at
+            if lead >= 0:
+                self.render_lead.observe(lead)
+            else:
+                # includes items submitted for immediate air, which cannot be rendered ahead
+                self.render_late.observe(-lead)
+            if now - item.at > LATE_TOLERANCE:
+                self.counts['missed_deadlines'] += 1
+        if self.on_air is not None:
+            self.on_air(item)
+
+    def _next_wakeup(self, now):
+        times = []
+        if self.airing is not None:
+            times.append(self.airing.started + self.airing.duration(self.sample_rate))
+        if self._ready and (self.airing is None or self._preempting()):
+            times.append(now)
+        for at, seq, item in self._upcoming:
+            if item.future is None and item.audio is None and item.state != FAILED:
+                times.append(at - self.render_ahead)
+                break
+        if self._upcoming:
+            times.append(self._upcoming[0][0])
+        if not times:
+            return None
+        return max(min(times), now)
@@ -0,0 +1,209 @@
+# ###    PySame search    ###
+#
+# Fuzzy and prefix search over county, state and event names, used to suggest
+# corrections for misspelled validator input and to auto-resolve close matches in
+# batch jobs. Names are normalized (case, accents, punctuation, "Saint" -> "St",
+# a trailing "County" / "Parish" / "Borough" dropped) and indexed three ways:
+#   - an exact dictionary on the normalized name with spaces removed, so that
+#     "Prince George's" finds "Prince Georges" and "DeKalb" finds "De Kalb"
+#   - a sorted list of names for prefix matches ("prince g")
+#   - a trigram inverted index with NumPy posting arrays; one bincount over the
+#     postings of the query's trigrams gives the Dice similarity of every name
+# Indexes are built once per catalog on first use (Catalog.search_index).
+
+from bisect import bisect_left
+from collections import defaultdict, namedtuple
+import re
+import unicodedata
+import numpy as np
+
+from .catalog import get_catalog
+
+# Score of a prefix match covering none of the name; a full-length prefix scores 1.
+PREFIX_SCORE = 0.8
+# Candidates at or above this score are offered as "did you mean" suggestions.
+SUGGEST_SCORE = 0.5
+
+_DROP_WORDS = ('county', 'parish', 'borough')
+_punctuation = re.compile(r"['’.]")
+_separators = re.compile(r'[^a-z0-9]+')
+
+# name: the catalog spelling, value: what the name stands for (e.g. an event code), score: 0 .. 1.
+Match = namedtuple('Match', 'name value score')
+
+
+# Lowercases and strips accents and punctuation, e.g. "Prince George's County" -> "prince georges".
+def normalize(text):
+    text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii').lower()
+    text = _separators.sub(' ', _punctuation.sub('', text)).split()
+    text = ['st' if word == 'saint' else word for word in text]
+    while len(text) > 1 and text[-1] in _DROP_WORDS:
+        text.pop()
+    return ' '.join(text)
+
+
+def trigrams(key):
+    padded = '  {} '.format(key)
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SearchIndex:
+    # names are the searchable spellings, values what each stands for (returned in Match.value).
+    # groups optionally assigns every name to a group (e.g. its state id) to restrict searches to.
+    def __init__(self, names, values, groups=None):
+        self.names = list(names)
+        self.values = list(values)
+        keys = [normalize(name) for name in self.names]
+
+        self._exact = defaultdict(list)
+        postings = defaultdict(list)
+        self._sizes = np.empty(len(keys))
+        for i, key in enumerate(keys):
+            self._exact[key.replace(' ', '')].append(i)
+            grams = trigrams(key)
+            self._sizes[i] = len(grams)
+            for gram in grams:
+                postings[gram].append(i)
+        self._postings = {gram: np.array(ids, dtype=np.intp) for gram, ids in postings.items()}
+        self._sorted = sorted((key, i) for i, key in enumerate(keys))
+        self._keys = keys
+
+        self._groups = {}
+        if groups is not None:
+            by_group = defaultdict(list)
+            for i, group in enumerate(groups):
+                by_group[group].append(i)
+            self._groups = {group: np.array(ids, dtype=np.intp) for group, ids in by_group.items()}
+
+    def __len__(self):
+        return len(self.names)
+
+    # Returns up to limit Matches for query, best first, with score >= min_score.
+    # group restricts the search to the names of one group.
+    def search(self, query, limit=5, min_score=0.0, group=None):
+        key = normalize(query)
+        if key == '' or not self.names:
+            return []
+
+        grams = trigrams(key)
+        lists = [self._postings[g] for g in grams if g in self._postings]
+        if lists:
+            common = np.bincount(np.concatenate(lists), minlength=len(self.names))
+            scores = 2.0 * common / (len(grams) + self._sizes)
+        else:
+            scores = np.zeros(len(self.names))
+
+        i = bisect_left(self._sorted, (key,))
+        while i < len(self._sorted) and self._sorted[i][0].startswith(key):
+            name_key, j = self._sorted[i]
+            scores[j] = max(scores[j], PREFIX_SCORE + (1.0 - PREFIX_SCORE) * len(key) / len(name_key))
+            i += 1
+        for j in self._exact.get(key.replace(' ', ''), ()):
+            scores[j] = 1.0
+
+        if group is not None:
+            ids = self._groups.get(group)
+            if ids is None:
+                return []
+        else:
+            ids = np.arange(len(self.names))
+        candidates = scores[ids]
+        if len(ids) > limit:
+            top = np.argpartition(-candidates, limit)[:limit]
+        else:
+            top = np.arange(len(ids))
+        top = top[np.argsort(-candidates[top], kind='stable')]
+        return [Match(self.names[ids[j]], self.values[ids[j]], float(candidates[j]))
+                for j in top if candidates[j] >= min_score and candidates[j] > 0]
+
+    # The single best Match for query, or None if nothing scores at least min_score.
+    def best(self, query, min_score=SUGGEST_SCORE, group=None):
+        matches = self.search(query, 1, min_score, group)
+        return matches[0] if matches else None
+
+
+# Builds the index of one kind over a Catalog:
+#   'counties': value (state id, county id), grouped by state id
+#   'states':   value state id
+#   'events':   value event code
+def build_index(catalog, kind):
+    if kind == 'counties':
+        names, values, groups = [], [], []
+        for state_id, state_name, counties in catalog.states:
+            for county_id, county_name in counties:
+                names.append(county_name)
+                values.append((state_id, county_id))
+                groups.append(state_id)
+        return SearchIndex(names, values, groups)
+    if kind == 'states':
+        return SearchIndex([name for state_id, name, counties in catalog.states],
+                           [state_id for state_id, name, counties in catalog.states])
+    if kind == 'events':
+        return SearchIndex([name for code, name, us, lvl in catalog.event_list],
+                           [code for code, name, us, lvl in catalog.event_list])
+    raise ValueError('Unknown search index {}'.format(kind))
+
+
+def search_counties(query, state_id=None, limit=5, catalog=None):
+    return (catalog or get_catalog()).search_index('counties').search(query, limit, group=state_id)
+
+
+def search_states(query, limit=5, catalog=None):
+    return (catalog or get_catalog()).search_index('states').search(query, limit)
+
+
+def search_events(query, limit=5, catalog=None):
+    return (catalog or get_catalog()).search_index('events').search(query, limit)
+
+
+# " - did you mean X?" for the best match, or '' if there is none worth offering.
+def suggestion(match):
+    if match is None:
+        return ''
+    return ' - did you mean {}?'.format(match.name)
+
+
+# Replaces an event name in a check_2 input with its best match scoring at least threshold.
+# Returns (new input, [(old, new, score)]); the input is unchanged if nothing qualifies.
+def correct_event(stri, threshold, catalog=None):
+    catalog = catalog or get_catalog()
+    if len(stri) == 3 or stri.lower() in catalog.event_names:
+        return stri, []
+    match = catalog.search_index('events').best(stri, threshold)
+    if match is None:
+        return stri, []
+    return match.name, [(stri, match.name, match.score)]
+
+
+# Replaces unknown state and county names in a check_3 input ('County, ST. State. ...') with
+# their best matches scoring at least threshold. Returns (new input, [(old, new, score)]).
+def correct_locations(stri, threshold, catalog=None):
+    catalog = catalog or get_catalog()
+    index = catalog.fips_index
+    entries = []
+    changes = []
+    for location in stri.split('.'):
+        parts = [x.strip() for x in location.split(',')]
+        if location.strip() == '' or len(parts) > 2:
+            entries.append(location.strip())
+            continue
+
+        state = parts[-1]
+        found = index.state_by_abv(state) if len(state) == 2 else index.state_by_name(state)
+        if found is None and len(state) != 2:
+            match = catalog.search_index('states').best(state, threshold)
+            if match is not None:
+                changes.append((state, match.name, match.score))
+                state = match.name
+                found = index.state_by_name(state)
+
+        if len(parts) == 2 and found is not None and index.county(parts[0], found[0]) is None:
+            match = catalog.search_index('counties').best(parts[0], threshold, group=found[0])
+            if match is not None:
+                changes.append((parts[0], match.name, match.score))
+                parts[0] = match.name
+        parts[-1] = state
+        entries.append(', '.join(parts))
+    if not changes:
+        return stri, []
+    return '. '.join(entries), changes
@@ -0,0 +1,334 @@
+# ###    PySame rendering service    ###
+#
+# Long-running local HTTP service built on asyncio. Catalogs and tone tables are
+# loaded once at start-up and stay warm. Validation runs on the event loop (it is
+# only dictionary lookups); synthesis runs on a process pool so the loop never
+# stalls. Concurrent requests that resolve to the same header and render
+# parameters share a single render. The catalogs are reloaded in the background
+# when their files change (see catalog.CatalogWatcher); a request is validated
+# against the catalog current when it arrived, whose version is sent back in the
+# X-Catalog-Version header. Response header values are sent as ASCII, with '%',
+# control characters and anything outside ASCII percent-encoded as UTF-8 (a
+# callsign may hold any character the validator accepts). A client that takes
+# longer than READ_TIMEOUT seconds to send its request gets a 408.
+#
+#   POST /render   body: JSON object with the six fields (as in batch job files)
+#                  query: format=wav|pcm, rate=<Hz>, message=1 (full message), strict=1,
+#                         encoding=pcm16|float32|ulaw, timing=legacy|exact,
+#                         resolve=<score> (auto-correct close misspellings, see batch)
+#                  -> audio/wav bytes, or a chunked raw little-endian sample body
+#   GET  /health   -> JSON counters and the current catalog version
+#   GET  /metrics  -> stage timings in Prometheus text format (with --metrics; renders
+#                     in worker processes are timed as a whole, as the "render" stage)
+#
+# usage: pysame-server [--host 127.0.0.1] [--port 8080] [-j workers] [--cache dir] [--metrics] [--reload seconds]
+
+import asyncio
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import json
+import multiprocessing
+import os
+import struct
+import sys
+from urllib.parse import parse_qs, quote, urlsplit
+import numpy as np
+
+from .batch import render_bytes, render_cached, validate_job
+from .formats import FORMATS, TIMINGS
+from . import instrument
+from .catalog import DEFAULT_WATCH_INTERVAL, CatalogWatcher, get_catalog
+from .header import create_header
+from .synthesis import export_tone_tables, install_tone_tables, tone_table
+from .validate import FIELDS
+from .wavstream import HEADER_SIZE
+
+MAX_BODY = 64 * 1024
+STREAM_CHUNK = 64 * 1024
+READ_TIMEOUT = 30.0
+# printable ASCII left as-is in response header values; everything else is percent-encoded
+HEADER_SAFE = ''.join(chr(c) for c in range(0x20, 0x7f) if chr(c) != '%')
+SAMPLE_RATES = (8000, 11025, 16000, 22050, 32000, 44100, 48000)
+
+_reasons = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+            408: 'Request Timeout', 413: 'Payload Too Large', 422: 'Unprocessable Entity', 500: 'Internal Server Error'}
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+# Renders a header (or full message) to WAV bytes in a pool worker, through the
+# on-disk cache when one is configured. Returns (bytes, cache hit).
+def render_wav(header, sample_rate, message, cache_dir=None, fmt='pcm16', timing='legacy'):
+    if cache_dir is None:
+        return render_bytes(header, sample_rate, message, fmt, timing), False
+    return render_cached(header, cache_dir, sample_rate, message, fmt, timing)
+
+
+def _init_worker(tables):
+    install_tone_tables(tables)
+
+
+def _warm_up(i):
+    return len(render_bytes('NNNN', 44100, False))
+
+
+def _prepare_catalog(catalog):
+    for kind in ('counties', 'states', 'events'):
+        catalog.search_index(kind)
+
+
+class RenderService:
+    # workers > 0 renders on a process pool of that size, 0 renders on a single thread.
+    # cache_dir enables the shared on-disk render cache. The catalog files are checked
+    # for changes every reload_interval seconds (0 to never reload).
+    def __init__(self, workers=1, cache_dir=None, reload_interval=DEFAULT_WATCH_INTERVAL):
+        self.cache_dir = cache_dir
+        _prepare_catalog(get_catalog())
+        self.watcher = None
+        if reload_interval > 0:
+            self.watcher = CatalogWatcher(reload_interval, _prepare_catalog).start()
+        for rate in SAMPLE_RATES:
+            tone_table(rate, np.int16)
+        if workers > 0:
+            # forking from a process that already runs an event loop and executor threads
+            # can deadlock the children, so workers come from a fork server (or spawn)
+            methods = multiprocessing.get_all_start_methods()
+            ctx = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+            self.executor = ProcessPoolExecutor(workers, mp_context=ctx, initializer=_init_worker,
+                                                initargs=(export_tone_tables(),))
+            # start the workers and warm them up before the first request
+            list(self.executor.map(_warm_up, range(workers)))
+        else:
+            self.executor = ThreadPoolExecutor(1)
+        self._inflight = {}
+        self.stats = {'requests': 0, 'renders': 0, 'coalesced': 0, 'cache_hits': 0, 'rejected': 0, 'errors': 0}
+
+    def close(self):
+        if self.watcher is not None:
+            self.watcher.stop()
+        self.executor.shutdown()
+
+    # Returns WAV bytes for the header; identical concurrent calls share one render.
+    async def render(self, header, sample_rate=44100, message=False, fmt='pcm16', timing='legacy'):
+        key = (header, sample_rate, message, fmt, timing)
+        task = self._inflight.get(key)
+        if task is not None:
+            self.stats['coalesced'] += 1
+            return await asyncio.shield(task)
+
+        task = asyncio.ensure_future(self._render(header, sample_rate, message, fmt, timing))
+        self._inflight[key] = task
+        try:
+            return await asyncio.shield(task)
+        finally:
+            if self._inflight.get(key) is task:
+                del self._inflight[key]
+
+    async def _render(self, header, sample_rate, message, fmt, timing):
+        loop = asyncio.get_running_loop()
+        with instrument.stage('render'):
+            data, hit = await loop.run_in_executor(self.executor, render_wav, header, sample_rate, message, self.cache_dir,
+                                                   fmt, timing)
+        self.stats['cache_hits' if hit else 'renders'] += 1
+        return data
+
+    async def handle(self, reader, writer):
+        try:
+            await self._handle(reader, writer)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _handle(self, reader, writer):
+        try:
+            method, target, headers = await _read(_read_head(reader))
+            url = urlsplit(target)
+            query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+
+            if url.path == '/health':
+                stats = dict(self.stats, inflight=len(self._inflight), catalog=get_catalog().version)
+                if self.watcher is not None:
+                    stats.update(catalog_reloads=self.watcher.reloads, catalog_errors=self.watcher.errors)
+                await _send(writer, 200, json.dumps(stats).encode(), 'application/json')
+                return
+            if url.path == '/metrics':
+                if not instrument.is_enabled():
+                    raise HttpError(404, 'Metrics are off (start the server with --metrics)')
+                await _send(writer, 200, instrument.to_prometheus().encode(), 'text/plain; version=0.0.4')
+                return
+            if url.path != '/render':
+                raise HttpError(404, 'Unknown path {}'.format(url.path))
+            if method != 'POST':
+                raise HttpError(405, 'Use POST')
+            self.stats['requests'] += 1
+
+            try:
+                length = int(headers.get('content-length', 0))
+            except ValueError:
+                raise HttpError(400, 'Invalid Content-Length {}'.format(headers['content-length']))
+            if length < 0:
+                raise HttpError(400, 'Invalid Content-Length {}'.format(length))
+            if length > MAX_BODY:
+                raise HttpError(413, 'Request body too large')
+            try:
+                record = json.loads(await _read(reader.readexactly(length)))
+            except ValueError as e:
+                raise HttpError(400, 'Invalid JSON: {}'.format(e))
+            if isinstance(record, list):
+                record = dict(zip(FIELDS, record))
+            if not isinstance(record, dict):
+                raise HttpError(400, 'Expected a JSON object with the six header fields')
+
+            try:
+                sample_rate = int(query.get('rate', 44100))
+            except ValueError:
+                raise HttpError(400, 'Invalid sample rate {}'.format(query['rate']))
+            if sample_rate not in SAMPLE_RATES:
+                raise HttpError(400, 'Unsupported sample rate {}'.format(sample_rate))
+            fmt = query.get('format', 'wav')
+            if fmt not in ('wav', 'pcm'):
+                raise HttpError(400, 'Unknown format {}'.format(fmt))
+            encoding = query.get('encoding', 'pcm16')
+            if encoding not in FORMATS or encoding == 'float64':
+                raise HttpError(400, 'Unknown encoding {}'.format(encoding))
+            timing = query.get('timing', 'legacy')
+            if timing not in TIMINGS:
+                raise HttpError(400, 'Unknown timing {}'.format(timing))
+
+            try:
+                auto_resolve = float(query['resolve']) if 'resolve' in query else None
+            except ValueError:
+                raise HttpError(400, 'Invalid resolve score {}'.format(query['resolve']))
+            catalog = get_catalog()
+            values, warnings, errors = validate_job(record, auto_resolve, catalog)
+            if query.get('strict') == '1' and warnings:
+                errors = errors + warnings
+            if errors:
+                self.stats['rejected'] += 1
+                body = json.dumps({'errors': errors, 'warnings': warnings, 'catalog': catalog.version}).encode()
+                await _send(writer, 422, body, 'application/json', {'X-Catalog-Version': catalog.version})
+                return
+
+            binaryData, stringData = create_header(values)
+            wav = await self.render(stringData, sample_rate, query.get('message') == '1', encoding, timing)
+
+            extra = {'X-Same-Header': stringData, 'X-Same-Warnings': json.dumps(warnings),
+                     'X-Catalog-Version': catalog.version}
+            if fmt == 'wav':
+                await _send(writer, 200, wav, 'audio/wav', extra)
+            else:
+                extra['X-Sample-Rate'] = str(sample_rate)
+                extra['X-Sample-Format'] = encoding
+                await _send_chunked(writer, _wav_data(wav), 'application/octet-stream', extra)
+        except HttpError as e:
+            await _send(writer, e.status, json.dumps({'errors': [str(e)]}).encode(), 'application/json')
+        except (ConnectionError, asyncio.IncompleteReadError):
+            raise
+        except Exception as e:
+            self.stats['errors'] += 1
+            await _send(writer, 500, json.dumps({'errors': [repr(e)]}).encode(), 'application/json')
+
+
+# Awaits a read from the client, giving up after READ_TIMEOUT seconds.
+async def _read(awaitable):
+    try:
+        return await asyncio.wait_for(awaitable, READ_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise HttpError(408, 'Timed out reading the request')
+
+
+async def _read_head(reader):
+    line = await reader.readline()
+    parts = line.decode('latin-1').split()
+    if len(parts) != 3:
+        raise HttpError(400, 'Malformed request line')
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, sep, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    return parts[0].upper(), parts[1], headers
+
+
+# The samples of a rendered WAV file, without the header and the RIFF pad byte.
+def _wav_data(wav):
+    data_size = struct.unpack_from('<I', wav, HEADER_SIZE - 4)[0]
+    return memoryview(wav)[HEADER_SIZE:HEADER_SIZE + data_size]
+
+
+def _head(status, content_type, extra, length=None):
+    lines = ['HTTP/1.1 {} {}'.format(status, _reasons.get(status, '')),
+             'Content-Type: {}'.format(content_type), 'Connection: close']
+    if length is None:
+        lines.append('Transfer-Encoding: chunked')
+    else:
+        lines.append('Content-Length: {}'.format(length))
+    for name, value in (extra or {}).items():
+        lines.append('{}: {}'.format(name, quote(value, safe=HEADER_SAFE)))
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+
+async def _send(writer, status, body, content_type, extra=None):
+    writer.write(_head(status, content_type, extra, len(body)))
+    writer.write(body)
+    await writer.drain()
+
+
+async def _send_chunked(writer, body, content_type, extra=None):
+    writer.write(_head(200, content_type, extra))
+    for i in range(0, len(body), STREAM_CHUNK):
+        chunk = body[i:i + STREAM_CHUNK]
+        writer.write('{:x}\r\n'.format(len(chunk)).encode())
+        writer.write(chunk)
+        writer.write(b'\r\n')
+        await writer.drain()
+    writer.write(b'0\r\n\r\n')
+    await writer.drain()
+
+
+# Starts the service and returns (service, asyncio server); port 0 picks a free port.
+async def start(host='127.0.0.1', port=8080, workers=1, cache_dir=None, reload_interval=DEFAULT_WATCH_INTERVAL):
+    service = RenderService(workers, cache_dir, reload_interval)
+    server = await asyncio.start_server(service.handle, host, port)
+    return service, server
+
+
+async def serve(host='127.0.0.1', port=8080, workers=1, cache_dir=None, reload_interval=DEFAULT_WATCH_INTERVAL):
+    service, server = await start(host, port, workers, cache_dir, reload_interval)
+    print('Serving on http://{}:{}/render'.format(*server.sockets[0].getsockname()[:2]))
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Local HTTP service rendering SAME headers.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count() or 1, help='render processes (0 = render on a thread)')
+    parser.add_argument('--cache', default=None, help='directory of an on-disk render cache')
+    parser.add_argument('--metrics', action='store_true', help='record stage timings and serve them on /metrics')
+    parser.add_argument('--reload', type=float, default=DEFAULT_WATCH_INTERVAL, metavar='SECONDS',
+                        help='check the catalog files for changes this often (0 = never reload)')
+    args = parser.parse_args(argv)
+    if args.metrics:
+        instrument.enable()
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, args.cache, args.reload))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
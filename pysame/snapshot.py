@@ -0,0 +1,213 @@
+# ###    PySame catalog snapshot    ###
+#
+# Compiles the four reference catalogs (events.xml, originatorcodes.xml, fips.xml
+# and uspsAbs.json) into one versioned binary snapshot, so that starting the tool
+# loads plain Python data with a single marshal call instead of parsing XML.
+# The snapshot records the size and modification time of every source file and
+# is rebuilt automatically when one of them changes. Catalog files are resolved
+# relative to the package's data directory, not the current working directory.
+# The snapshot itself lives in the user's cache directory (PYSAME_CACHE_DIR to
+# override), never in the installed package, which may be read-only and whose
+# files are tracked by pip. Its name is derived from the data directory and the
+# Python version, so several installs can share one cache directory.
+#
+# usage: python -m pysame.snapshot            (re)build the snapshot
+#        python -m pysame.snapshot --bench    compare cold-start time with and without it
+
+import json
+import marshal
+import os
+import sys
+import time
+import zlib
+
+from .fipsindex import states_from_xml
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+_ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MAGIC = b'PYSAME-CATALOG\n'
+FORMAT_VERSION = 1
+
+SOURCES = {
+    'events': 'events.xml',
+    'originators': 'originatorcodes.xml',
+    'states': 'fips.xml',
+    'abvs': 'uspsAbs.json'
+}
+
+# Set to bypass the snapshot and always parse the source files.
+NO_SNAPSHOT_ENV = 'PYSAME_NO_SNAPSHOT'
+# Directory for the snapshot instead of the user's cache directory.
+CACHE_DIR_ENV = 'PYSAME_CACHE_DIR'
+
+
+def cache_dir():
+    path = os.environ.get(CACHE_DIR_ENV)
+    if path:
+        return path
+    if os.name == 'nt':
+        base = os.environ.get('LOCALAPPDATA') or os.path.join(os.path.expanduser('~'), 'AppData', 'Local')
+    elif sys.platform == 'darwin':
+        base = os.path.join(os.path.expanduser('~'), 'Library', 'Caches')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'pysame')
+
+
+# The snapshot file for the catalogs in data_dir.
+def snapshot_path(data_dir=DATA_DIR):
+    tag = '{}|{}.{}'.format(os.path.abspath(data_dir), *sys.version_info[:2])
+    return os.path.join(cache_dir(), 'catalogs-{:08x}.snapshot'.format(zlib.crc32(tag.encode('utf-8'))))
+
+
+def source_path(name, data_dir=DATA_DIR):
+    return os.path.join(data_dir, SOURCES[name])
+
+
+# (size, mtime) of every source file, used to detect a stale snapshot.
+def source_stamps(data_dir=DATA_DIR):
+    stamps = {}
+    for name in SOURCES:
+        st = os.stat(source_path(name, data_dir))
+        stamps[name] = (st.st_size, st.st_mtime_ns)
+    return stamps
+
+
+# Parses the source files into plain data:
+#   originators: {code: (name, unused)}
+#   events:      [(code, name, us, lvl)] in file order
+#   states:      [(state id, state name, [(county id, county name)])]
+#   abvs:        {USPS abbreviation: state name}
+def parse_sources(data_dir=DATA_DIR):
+    # imported here so that loading from the snapshot never pays for ElementTree
+    import xml.etree.ElementTree as et
+
+    orgcds_root = et.parse(source_path('originators', data_dir)).getroot()
+    events_root = et.parse(source_path('events', data_dir)).getroot()
+    fips_root = et.parse(source_path('states', data_dir)).getroot()
+    with open(source_path('abvs', data_dir)) as f:
+        state_abvs = json.load(f)
+
+    return {
+        'originators': {elem.tag: (elem.text, len(elem.attrib) != 0) for elem in orgcds_root},
+        'events': [(elem.attrib['code'], elem.text, elem.attrib['us'], elem.attrib['lvl']) for elem in events_root],
+        'states': states_from_xml(fips_root),
+        'abvs': state_abvs
+    }
+
+
+# Parses the sources and writes the snapshot atomically (default: to snapshot_path). Returns the catalog data.
+def build_snapshot(data_dir=DATA_DIR, snapshot_file=None):
+    snapshot_file = snapshot_file or snapshot_path(data_dir)
+    stamps = source_stamps(data_dir)
+    catalog = parse_sources(data_dir)
+    payload = marshal.dumps({'version': FORMAT_VERSION, 'sources': stamps, 'catalog': catalog})
+
+    os.makedirs(os.path.dirname(snapshot_file), exist_ok=True)
+    tmp = '{}.{}.tmp'.format(snapshot_file, os.getpid())
+    try:
+        with open(tmp, 'wb') as f:
+            f.write(MAGIC)
+            f.write(payload)
+        os.replace(tmp, snapshot_file)
+    except OSError:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return catalog
+
+
+# Returns the catalog data from the snapshot, or None if it is missing, corrupt,
+# of another format version or older than the source files.
+def read_snapshot(data_dir=DATA_DIR, snapshot_file=None):
+    try:
+        with open(snapshot_file or snapshot_path(data_dir), 'rb') as f:
+            raw = f.read()
+    except OSError:
+        return None
+    if not raw.startswith(MAGIC):
+        return None
+    try:
+        snap = marshal.loads(raw[len(MAGIC):])
+    except (EOFError, ValueError, TypeError):
+        return None
+    if not isinstance(snap, dict) or snap.get('version') != FORMAT_VERSION:
+        return None
+    if snap.get('sources') != source_stamps(data_dir):
+        return None
+    return snap['catalog']
+
+
+# Loads the catalogs, from the snapshot when it is current and from the sources
+# otherwise (rebuilding the snapshot if the cache directory is writable).
+def load_catalog(data_dir=DATA_DIR, snapshot_file=None):
+    if os.environ.get(NO_SNAPSHOT_ENV):
+        return parse_sources(data_dir)
+    catalog = read_snapshot(data_dir, snapshot_file)
+    if catalog is not None:
+        return catalog
+    try:
+        return build_snapshot(data_dir, snapshot_file)
+    except OSError:
+        return parse_sources(data_dir)
+
+
+def _cold_start(code, env, runs):
+    import subprocess
+
+    best = None
+    for i in range(runs):
+        t = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code], env=env, cwd=_ROOT_DIR, check=True)
+        elapsed = time.perf_counter() - t
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+# Prints in-process load times and best-of-N cold-start times (a fresh interpreter
+# loading the catalogs, and a fresh interpreter importing pysame and running a
+# validator) with the snapshot and with XML parsing.
+def bench(runs=5):
+    build_snapshot()
+
+    t = time.perf_counter()
+    for i in range(runs):
+        parse_sources()
+    parse_time = (time.perf_counter() - t) / runs
+    t = time.perf_counter()
+    for i in range(runs):
+        read_snapshot()
+    load_time = (time.perf_counter() - t) / runs
+    print('catalog load   parse sources {:8.2f} ms   snapshot {:8.2f} ms'.format(parse_time * 1000, load_time * 1000))
+
+    env = dict(os.environ)
+    env.pop(NO_SNAPSHOT_ENV, None)
+    no_snapshot_env = dict(env)
+    no_snapshot_env[NO_SNAPSHOT_ENV] = '1'
+    print('interpreter alone            {:8.2f} ms'.format(_cold_start('pass', env, runs) * 1000))
+    for label, code in (('cold catalog', 'from pysame import snapshot; snapshot.load_catalog()'),
+                        ('cold pysame ', 'import pysame; pysame.check_1("PEP")')):
+        without_snapshot = _cold_start(code, no_snapshot_env, runs)
+        with_snapshot = _cold_start(code, env, runs)
+        print('{}   parse sources {:8.2f} ms   snapshot {:8.2f} ms'.format(label, without_snapshot * 1000, with_snapshot * 1000))
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Build the catalog snapshot.')
+    parser.add_argument('--bench', action='store_true', help='measure cold-start time with and without the snapshot')
+    parser.add_argument('-n', '--runs', type=int, default=5, help='runs per measurement')
+    args = parser.parse_args(argv)
+
+    if args.bench:
+        bench(args.runs)
+    else:
+        build_snapshot()
+        print('Snapshot saved as {}'.format(snapshot_path()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+# ###    PySame synthesis engine    ###
+#
+# Batched FSK synthesis. Every bit of a SAME burst is one of two fixed waveforms
+# (mark or space), so the whole signal can be built with a single fancy-indexing
+# operation on a stacked (2, samples_per_bit) tone table instead of a per-bit loop.
+# Tables are kept per (sample rate, format, timing); see pysame.formats.
+#
+# The table renderer starts every bit at phase zero. That is continuous while a bit
+# holds a whole number of cycles, but with exact timing bits are one sample longer or
+# shorter than their nominal length and the phase jumps at every boundary. The "nco"
+# renderer instead runs a 32-bit phase accumulator over the bit stream: one cumulative
+# sum of the per-bit phase advance gives the start phase of every bit, and within a
+# bit the phase grows by a fixed step per sample whose top bits index a sine lookup
+# table. Start phases are rounded to START_BITS bits, so every bit is one row of a
+# precomputed (2 * 2**START_BITS, samples_per_bit) table and the signal is gathered
+# row by row, just like the table renderer. The accumulator itself is never rounded.
+# With legacy timing every bit holds a whole number of cycles, so the accumulator
+# only drifts by the rounding of the phase steps; while that drift stays under half
+# a row every bit starts in row 0 and the rows are simply the bits.
+
+import numpy as np
+
+from .formats import bit_samples, bit_starts, encode, get_format
+
+RENDERERS = ('table', 'nco')
+
+# Space and mark are 3 and 4 cycles per bit.
+CYCLES_PER_BIT = (3.0, 4.0)
+SINE_BITS = 16
+SINE_SIZE = 1 << SINE_BITS
+START_BITS = 10
+
+_tone_tables = {}
+_sine_tables = {}
+_legacy_drifts = {}
+
+
+# Number of samples used for each bit at the given sample rate.
+def samples_per_bit(sample_rate):
+    return bit_samples(sample_rate)
+
+
+# Converts float samples in [-1, 1] to the requested dtype or format name, the same way
+# write_audio_file scales to int16.
+def convert_samples(audio, dtype):
+    return encode(audio, dtype)
+
+
+# Returns the table of space (row 0) and mark (row 1) waveforms. With legacy timing a row
+# is exactly one bit long; with exact timing it holds the longest bit (one sample more than
+# the fractional length), each sample k at phase k / exact samples per bit.
+# Tables are built once per (sample_rate, format, timing) and kept for the life of the process.
+def tone_table(sample_rate, dtype=np.float64, timing='legacy'):
+    fmt = get_format(dtype)
+    key = (sample_rate, fmt.name, timing)
+    table = _tone_tables.get(key)
+    if table is None:
+        spb = bit_samples(sample_rate, timing)
+        if timing == 'legacy':
+            t = np.arange(0, 1.0, 1 / spb)
+        else:
+            t = np.arange(int(spb) + 1) / spb
+        table = np.empty((2, len(t)))
+        table[0] = np.sin(6.0 * np.pi * t)
+        table[1] = np.sin(8.0 * np.pi * t)
+        table = encode(table, fmt)
+        table.setflags(write=False)
+        _tone_tables[key] = table
+    return table
+
+
+# Returns one full sine cycle of SINE_SIZE samples in the given dtype (or format name).
+def sine_table(dtype=np.float64):
+    fmt = get_format(dtype)
+    table = _sine_tables.get(fmt.name)
+    if table is None:
+        table = encode(np.sin(2.0 * np.pi * np.arange(SINE_SIZE) / SINE_SIZE), fmt)
+        table.setflags(write=False)
+        _sine_tables[fmt.name] = table
+    return table
+
+
+# Per-sample phase steps of space and mark, in units of 2**-32 cycles.
+def phase_steps(sample_rate, timing='legacy'):
+    spb = bit_samples(sample_rate, timing)
+    return np.round(np.array(CYCLES_PER_BIT) / spb * 2.0 ** 32).astype(np.uint32)
+
+
+# Renders an array of bits into an FSK signal of the given dtype (or format name) in one pass.
+# timing='exact' starts every bit on its exact fractional position so the baud rate does not drift.
+# renderer='nco' keeps the phase continuous across bits (see above); 'table' is the original output.
+def render_bits(binary_data, sample_rate, dtype=np.float64, timing='legacy', renderer='table'):
+    bits = np.asarray(binary_data, dtype=bool).view(np.uint8)
+    if renderer == 'nco':
+        return render_nco(bits, sample_rate, dtype, timing)
+    if renderer != 'table':
+        raise ValueError('Unknown renderer {}'.format(renderer))
+
+    table = tone_table(sample_rate, dtype, timing)
+    if timing == 'legacy':
+        return table[bits].reshape(-1)
+    return _join_rows(table[bits], np.diff(bit_starts(len(bits), sample_rate, timing)))
+
+
+# Returns the NCO table: row 2 * p + bit is a bit starting at phase p / 2**START_BITS cycles.
+def nco_table(sample_rate, dtype=np.float64, timing='legacy'):
+    fmt = get_format(dtype)
+    key = (sample_rate, fmt.name, timing, 'nco')
+    table = _tone_tables.get(key)
+    if table is None:
+        steps = phase_steps(sample_rate, timing)
+        spb = bit_samples(sample_rate, timing)
+        width = spb if timing == 'legacy' else int(spb) + 1
+        starts = np.repeat(np.arange(1 << START_BITS, dtype=np.uint32) << (32 - START_BITS), 2)
+        phase = np.arange(width, dtype=np.uint32) * np.tile(steps, 1 << START_BITS)[:, None]
+        phase += starts[:, None]
+        phase >>= 32 - SINE_BITS
+        table = sine_table(fmt)[phase]
+        table.setflags(write=False)
+        _tone_tables[key] = table
+    return table
+
+
+# Largest phase error (in units of 2**-32 cycles) one legacy bit adds to the accumulator: a bit
+# is a whole number of cycles, so only the rounding of the phase steps is left over.
+def legacy_drift(sample_rate):
+    drift = _legacy_drifts.get(sample_rate)
+    if drift is None:
+        spb = bit_samples(sample_rate)
+        drift = max(abs((int(step) * spb + (1 << 31)) % (1 << 32) - (1 << 31)) for step in phase_steps(sample_rate))
+        _legacy_drifts[sample_rate] = drift
+    return drift
+
+
+# Phase-continuous rendering with a numerically controlled oscillator.
+def render_nco(binary_data, sample_rate, dtype=np.float64, timing='legacy'):
+    bits = np.asarray(binary_data, dtype=bool).view(np.uint8)
+    if timing == 'legacy' and len(bits) * legacy_drift(sample_rate) < 1 << (31 - START_BITS):
+        return nco_table(sample_rate, dtype, timing)[bits].reshape(-1)
+
+    steps = phase_steps(sample_rate, timing)
+    if timing == 'legacy':
+        lengths = None
+        advance = steps[bits] * np.uint32(bit_samples(sample_rate))
+    else:
+        lengths = np.diff(bit_starts(len(bits), sample_rate, timing))
+        advance = steps[bits] * lengths.astype(np.uint32)
+    start = np.cumsum(advance, dtype=np.uint32)
+    start -= advance
+
+    # round each start phase to the nearest table row, wrapping at a full cycle
+    rows = ((start >> (31 - START_BITS)) + 1) >> 1
+    rows &= (1 << START_BITS) - 1
+    rows = rows.astype(np.intp) * 2 + bits
+    table = nco_table(sample_rate, dtype, timing)
+    if lengths is None:
+        return table[rows].reshape(-1)
+    return _join_rows(table[rows], lengths)
+
+
+# Concatenates the first lengths[i] samples of every row.
+def _join_rows(rows, lengths):
+    return rows[np.arange(rows.shape[1]) < lengths[:, None]]
+
+
+# Returns every tone table built so far, e.g. to hand them to worker processes.
+def export_tone_tables():
+    return dict(_tone_tables)
+
+
+# Installs tone tables built elsewhere (see export_tone_tables) so they are not rebuilt.
+def install_tone_tables(tables):
+    _tone_tables.update(tables)
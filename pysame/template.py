@@ -0,0 +1,96 @@
+# ###    PySame header templates    ###
+#
+# Every character of a header renders to a fixed-length span of samples, so a
+# field that changes between renders (typically the issue time or the callsign of
+# a recurring test) sits at a known sample offset. A HeaderTemplate keeps the
+# rendered PCM and, on update, rewrites only the spans of the characters that
+# changed. When the header length changes (e.g. a different number of location
+# codes) everything from the first differing character on is re-rendered.
+
+import numpy as np
+
+from .formats import get_format
+from .glyphcache import PREAMBLE, default_cache, header_bytes
+from .header import create_header
+from .synthesis import samples_per_bit
+from .validate import FIELDS
+
+
+class HeaderTemplate:
+    # fields are the six validated header values, as passed to create_header. dtype is a
+    # NumPy dtype or a format name; templates always use legacy (fixed-length) bit timing.
+    def __init__(self, fields, sample_rate=44100, dtype=np.int16, cache=None):
+        self.sample_rate = sample_rate
+        self.format = get_format(dtype)
+        self.dtype = self.format.dtype
+        self.cache = cache or default_cache
+        self.char_samples = 8 * samples_per_bit(sample_rate)
+        self.text_offset = len(PREAMBLE) * self.char_samples
+
+        self.fields = list(fields)
+        self.text = create_header(self.fields)[1]
+        self.patched_chars = 0
+        self.rendered_chars = 0
+
+        self._buf = np.empty(self._samples_for(len(self.text)), dtype=self.dtype)
+        self._buf[:self.text_offset] = self.cache.preamble(sample_rate, self.format)
+        self._render_from(0)
+
+    def _samples_for(self, length):
+        return self.text_offset + length * self.char_samples
+
+    def _put(self, i, value):
+        start = self.text_offset + i * self.char_samples
+        self._buf[start:start + self.char_samples] = self.cache.glyph(value, self.sample_rate, self.format)
+
+    def _render_from(self, first):
+        data = header_bytes(self.text)
+        for i in range(first, len(data)):
+            self._put(i, data[i])
+        self.rendered_chars += len(self.text) - first
+
+    # The rendered header. This is a view that the next update overwrites; copy it to keep it.
+    @property
+    def signal(self):
+        return self._buf[:self._samples_for(len(self.text))]
+
+    # Changes fields by name (originator, event, location, purge, issue, callsign) or
+    # replaces them all with fields, re-rendering only what changed. Returns the signal.
+    def update(self, fields=None, **changes):
+        new_fields = list(fields) if fields is not None else list(self.fields)
+        for name, value in changes.items():
+            if name not in FIELDS:
+                raise KeyError('Unknown header field {}'.format(name))
+            new_fields[FIELDS.index(name)] = value
+
+        old = self.text
+        new = create_header(new_fields)[1]
+        self.fields = new_fields
+        self.text = new
+
+        if len(new) == len(old):
+            a = np.frombuffer(header_bytes(old), dtype='B')
+            b = np.frombuffer(header_bytes(new), dtype='B')
+            changed = np.nonzero(a != b)[0]
+            for i in changed:
+                self._put(i, int(b[i]))
+            self.patched_chars += len(changed)
+            return self.signal
+
+        first = 0
+        while first < min(len(old), len(new)) and old[first] == new[first]:
+            first += 1
+        needed = self._samples_for(len(new))
+        if needed > len(self._buf):
+            grown = np.empty(max(needed, len(self._buf) * 3 // 2), dtype=self.dtype)
+            keep = self._samples_for(first)
+            grown[:keep] = self._buf[:keep]
+            self._buf = grown
+        self._render_from(first)
+        return self.signal
+
+    def set_issue_time(self, issue):
+        return self.update(issue=issue)
+
+    def set_callsign(self, callsign):
+        return self.update(callsign=callsign)
@@ -0,0 +1,167 @@
+# ###    PySame field validation    ###
+#
+# check_1 .. check_6 validate the six header fields. Each returns a tuple of
+# (value, code, message) where code is 0 for valid, 1 for a warning and 2 for an
+# error. The reference catalogs are loaded on the first call, not at import.
+# Every check takes an optional catalog to validate against (default: the current
+# one), so a caller can pin one catalog version for all six fields of a job.
+
+from datetime import datetime as dt, timezone
+
+from .catalog import get_catalog
+from .instrument import timed
+from .search import SUGGEST_SCORE, suggestion
+
+stages = {
+    1: "Originator code",
+    2: "Event code",
+    3: "Location codes",
+    4: "Purge time",
+    5: "Issue time",
+    6: "Station callsign"
+}
+
+# Names of the six fields, in header order (as used by job files and templates).
+FIELDS = ('originator', 'event', 'location', 'purge', 'issue', 'callsign')
+
+
+# Originator code
+@timed()
+def check_1(stri, catalog=None):
+    s = stri.upper()
+    fnd = (catalog or get_catalog()).originators.get(s)
+
+    if fnd is None:
+        return s, 2, s + ' invalid originator code'
+    name, unused = fnd
+    if unused:
+        return s, 1, 'Originator code {} - {} is no longer in use'.format(s, name)
+    return s, 0, ''
+
+
+# Event code
+@timed()
+def check_2(stri, catalog=None):
+    catalog = catalog or get_catalog()
+    if len(stri) == 3:
+        s = stri.upper()
+        elem = catalog.events.get(s)
+        if elem is None:
+            return s, 2, '{} invalid event code'.format(s)
+        if elem[1] == 'NI':
+            return s, 1, 'Event {} - {} is not in use'.format(s, elem[0])
+        return s, 0, ''
+
+    val = catalog.event_names.get(stri.lower())
+    if val is not None:
+        name, us, lvl = catalog.events[val]
+        if us == 'NI':
+            return val, 1, 'Event {} - {} is not in use'.format(val, name)
+        return val, 0, ''
+    match = catalog.search_index('events').best(stri, SUGGEST_SCORE)
+    return stri, 2, 'No event called \"' + stri + '\"' + suggestion(match)
+
+
+# Location codes
+@timed()
+def check_3(stri, catalog=None):
+    if stri == '0':
+        return '000000', 0, ''
+
+    catalog = catalog or get_catalog()
+    fips_index = catalog.fips_index
+
+    lcds = [x.strip() for x in stri.split('.')]
+    lcds = [x for x in lcds if x != '']
+
+    rtn = []
+
+    for location in lcds:
+        foo = [x.strip() for x in location.split(',')]
+        if len(foo) > 2:
+            return stri, 2, 'Doesn\'t understand {}'.format(location)
+
+        state = foo[-1]
+        if len(state) == 2:
+            state = state.upper()
+            if state not in catalog.state_abvs.keys():
+                return stri, 2, '{} is not a state'.format(state)
+            found_state = fips_index.state_by_abv(state)
+        else:
+            found_state = fips_index.state_by_name(state)
+            if found_state is None:
+                match = catalog.search_index('states').best(state, SUGGEST_SCORE)
+                return stri, 2, '{} is not a state{}'.format(state.lower() if len(foo) == 1 else state, suggestion(match))
+        state_id, state_name = found_state
+
+        if len(foo) == 1:
+            rtn.append('0{}000'.format(state_id))
+        else:
+            county = foo[0]
+            county_id = fips_index.county(county, state_id)
+            if county_id is None:
+                match = catalog.search_index('counties').best(county, SUGGEST_SCORE, group=state_id)
+                return stri, 2, 'County {} not found in {}{}'.format(county, state_name, suggestion(match))
+            rtn.append('0{}{}'.format(state_id, county_id))
+
+    if len(lcds) > 31:
+        return stri, 2, '{} location codes entered (maximum is 31)'.format(str(len(lcds)))
+
+    return '-'.join(rtn), 0, ''
+
+
+# Purge time
+@timed()
+def check_4(stri, catalog=None):
+    if stri == '0':
+        return '0000', 0, ''
+
+    if not stri.isnumeric() or len(stri) != 4:
+        return stri, 2, 'Incorrect format, input must be in hhmm format'
+
+    hour = int(stri[:2])
+    minute = int(stri[2:])
+
+    if hour == 0:
+        if minute % 15 == 0 and minute <= 45:
+            return stri, 0, ''
+        else:
+            return stri, 2, 'Purge time under 1 hour must be in 15 minute increments'
+    if hour < 6:
+        if minute == 0 or minute == 30:
+            return stri, 0, ''
+        else:
+            return stri, 2, 'Purge time between 1 to 6 hours must be in 30 minute increments'
+    if minute == 0:
+        return stri, 0, ''
+    else:
+        return stri, 2, 'Purge time beyond 6 hours must be in 1 hour increments'
+
+
+# Issue time
+@timed()
+def check_5(stri, catalog=None):
+    if stri == '0':
+        noww = dt.now(timezone.utc).strftime('%j%H%M')
+        return noww, 0, ''
+
+    try:
+        dtm = dt.strptime(stri, "%d/%m %H:%M").now(timezone.utc).strftime('%j%H%M')
+        return dtm, 0, ''
+    except ValueError as e:
+        return stri, 2, 'incorrect date format'
+
+
+# Station call sign
+@timed()
+def check_6(stri, catalog=None):
+    if len(stri) != 8:
+        return stri, 2, 'Station callsign must be 8 characters long'
+
+    if any(c in "!@#$\\%^&*()-+?_=,<>\"" for c in stri):
+        return stri, 2, 'Station callsign must not contain special characters except for \'/\''
+
+    return stri.upper(), 0, ''
+
+
+CHECKS = (check_1, check_2, check_3, check_4, check_5, check_6)
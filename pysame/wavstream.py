@@ -0,0 +1,192 @@
+# ###    PySame streaming WAV writer    ###
+#
+# Writes the RIFF header up front, appends PCM chunks as they are produced and
+# patches the chunk sizes on close, so the full signal never has to be held in
+# memory. Works with file names, open files and non-seekable streams such as pipes
+# (where the sizes are left at the 0xFFFFFFFF "unknown length" marker). RawWriter
+# writes the same sample stream without any header.
+
+import struct
+import numpy as np
+
+from .formats import FORMATS, get_format, ulaw_decode
+from .synthesis import convert_samples
+
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_IEEE_FLOAT = 3
+WAVE_FORMAT_MULAW = 7
+
+UNKNOWN_SIZE = 0xFFFFFFFF
+HEADER_SIZE = 44
+BLOCK_SIZE = 65536
+
+
+class RawWriter:
+    # target is a file name or a binary file object; dtype is a NumPy dtype or a format name
+    # (pcm16, float32, ulaw). Samples are written little-endian with no header.
+    def __init__(self, target, dtype=np.int16, channels=1):
+        self.format = get_format(dtype)
+        self.dtype = self.format.dtype
+        self.channels = channels
+        self.frames = 0
+        self.data_size = 0
+
+        if isinstance(target, (str, bytes)) or hasattr(target, '__fspath__'):
+            self._file = open(target, 'wb')
+            self._owns_file = True
+        else:
+            self._file = target
+            self._owns_file = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    # Appends samples. Float input is scaled to the file's sample type the same way write_audio_file does.
+    def write(self, samples):
+        samples = np.asarray(samples)
+        for i in range(0, len(samples), BLOCK_SIZE):
+            chunk = samples[i:i + BLOCK_SIZE]
+            if chunk.dtype != self.dtype:
+                chunk = convert_samples(chunk, self.format)
+            chunk = np.ascontiguousarray(chunk, dtype=self.dtype.newbyteorder('<'))
+            self._file.write(chunk.data)
+            self.data_size += chunk.nbytes
+        self.frames += len(samples) // self.channels
+
+    # Appends every chunk from an iterable (e.g. message_blocks).
+    def write_blocks(self, blocks):
+        for chunk in blocks:
+            self.write(chunk)
+
+    def close(self):
+        if self._file is None:
+            return
+        self._file.flush()
+        if self._owns_file:
+            self._file.close()
+        self._file = None
+
+
+class WavWriter(RawWriter):
+    # target is a file name or a binary file object; dtype is the sample type stored in the
+    # file, as a NumPy dtype or a format name: pcm16 (np.int16), float32 or ulaw (np.uint8).
+    def __init__(self, target, sample_rate, dtype=np.int16, channels=1):
+        super().__init__(target, dtype, channels)
+        if self.format.wav_tag is None:
+            if self._owns_file:
+                self._file.close()
+            raise ValueError('Unsupported WAV sample type {}'.format(self.dtype))
+        self.sample_rate = sample_rate
+
+        try:
+            self._seekable = self._file.seekable()
+        except (AttributeError, OSError):
+            self._seekable = False
+        if self._seekable:
+            self._start = self._file.tell()
+
+        self._file.write(self._header(UNKNOWN_SIZE))
+
+    def _header(self, data_size):
+        return wav_header(self.sample_rate, self.format, data_size, self.channels)
+
+    def close(self):
+        if self._file is None:
+            return
+        if self.data_size & 1:
+            self._file.write(b'\x00')
+        if self._seekable:
+            end = self._file.tell()
+            self._file.seek(self._start)
+            self._file.write(self._header(self.data_size))
+            self._file.seek(end)
+        self._file.flush()
+        if self._owns_file:
+            self._file.close()
+        self._file = None
+
+
+# The 44-byte header of a WAV file holding data_size bytes of samples (UNKNOWN_SIZE if not known yet).
+def wav_header(sample_rate, dtype, data_size, channels=1):
+    fmt = get_format(dtype)
+    width = fmt.dtype.itemsize
+    if data_size == UNKNOWN_SIZE:
+        riff_size = UNKNOWN_SIZE
+    else:
+        riff_size = HEADER_SIZE - 8 + data_size + (data_size & 1)
+    return b''.join([
+        b'RIFF', struct.pack('<I', riff_size), b'WAVE',
+        b'fmt ', struct.pack('<IHHIIHH', 16, fmt.wav_tag, channels, sample_rate,
+                             sample_rate * channels * width, channels * width, width * 8),
+        b'data', struct.pack('<I', data_size)
+    ])
+
+
+# Writes an iterable of sample chunks to target as a WAV file, or as headerless samples with raw.
+def write_stream(target, sample_rate, blocks, dtype=np.int16, raw=False):
+    with (RawWriter(target, dtype) if raw else WavWriter(target, sample_rate, dtype)) as w:
+        w.write_blocks(blocks)
+        return w.frames
+
+
+# Reads a mono 16-bit PCM, 32-bit float or 8-bit mu-law WAV file (name or binary file object) block by block.
+# Returns (sample_rate, generator of sample arrays); a streamed file with unknown size is read to the end.
+# Mu-law samples are expanded to 16-bit PCM.
+def read_blocks(source, block_size=BLOCK_SIZE):
+    f = open(source, 'rb') if isinstance(source, (str, bytes)) or hasattr(source, '__fspath__') else source
+    if f.read(4) != b'RIFF':
+        raise ValueError('Not a RIFF file')
+    f.read(4)
+    if f.read(4) != b'WAVE':
+        raise ValueError('Not a WAVE file')
+
+    fmt = None
+    while True:
+        head = f.read(8)
+        if len(head) < 8:
+            raise ValueError('No data chunk found')
+        chunk_id, size = head[:4], struct.unpack('<I', head[4:])[0]
+        if chunk_id == b'fmt ':
+            body = f.read(size + (size & 1))
+            fmt = struct.unpack('<HHIIHH', body[:16])
+        elif chunk_id == b'data':
+            break
+        else:
+            f.read(size + (size & 1))
+    if fmt is None:
+        raise ValueError('No fmt chunk found')
+
+    tag, channels, sample_rate, byte_rate, align, bits = fmt
+    if tag == WAVE_FORMAT_PCM and bits == 16:
+        dtype = np.dtype('<i2')
+    elif tag == WAVE_FORMAT_IEEE_FLOAT and bits == 32:
+        dtype = np.dtype('<f4')
+    elif tag == WAVE_FORMAT_MULAW and bits == 8:
+        dtype = FORMATS['ulaw'].dtype
+    else:
+        raise ValueError('Unsupported WAV format {} ({} bits)'.format(tag, bits))
+    remaining = None if size == UNKNOWN_SIZE else size
+
+    def blocks():
+        nonlocal remaining
+        try:
+            while remaining is None or remaining > 0:
+                want = block_size * align
+                if remaining is not None:
+                    want = min(want, remaining)
+                raw = f.read(want)
+                if not raw:
+                    break
+                if remaining is not None:
+                    remaining -= len(raw)
+                raw = raw[:len(raw) - len(raw) % align]
+                samples = np.frombuffer(raw, dtype=dtype).reshape(-1, channels)[:, 0]
+                yield ulaw_decode(samples) if tag == WAVE_FORMAT_MULAW else samples
+        finally:
+            if f is not source:
+                f.close()
+
+    return sample_rate, blocks()